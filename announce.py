@@ -0,0 +1,108 @@
+import asyncio
+from typing import Dict
+
+import discord
+
+# Discord rejects messages longer than this
+MESSAGE_LIMIT = 2000
+
+# --- LEVEL-UP ANNOUNCEMENTS ---
+
+class _Pending:
+    """Level-ups waiting to be sent to one channel"""
+    __slots__ = ("channel", "levels", "dropped")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.levels: Dict[int, int] = {}
+        self.dropped = 0
+
+class AnnouncementQueue:
+    """Per-channel outbound queue that merges level-ups into few messages
+
+    announce() only records the level-up and returns; a worker task per
+    channel waits window seconds, sends everything that piled up as one
+    message, and repeats until the channel is quiet. Each channel has at
+    most one send in flight, so a 429 handled by discord.py holds back only
+    that channel while new level-ups keep merging into its next message.
+    A user who levels up twice before the send is announced once at the
+    higher level; past max_pending users the rest become an "and N more".
+    """
+    def __init__(self, window: float = 2.0, max_pending: int = 25):
+        self.window = window
+        self.max_pending = max_pending
+        self._pending: Dict[int, _Pending] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+        self.announced = 0
+        self.merged = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failures = 0
+
+    def announce(self, channel: discord.abc.Messageable, user_id: int, level: int):
+        """Queue a level-up for a channel (never waits)"""
+        self.announced += 1
+        pending = self._pending.get(channel.id)
+        if pending is None:
+            pending = self._pending[channel.id] = _Pending(channel)
+
+        if user_id in pending.levels:
+            pending.levels[user_id] = max(pending.levels[user_id], level)
+            self.merged += 1
+        elif len(pending.levels) >= self.max_pending:
+            pending.dropped += 1
+            self.dropped += 1
+        else:
+            pending.levels[user_id] = level
+
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._drain(channel.id))
+
+    @staticmethod
+    def render(pending: _Pending) -> str:
+        if len(pending.levels) == 1 and not pending.dropped:
+            (user_id, level), = pending.levels.items()
+            return f"🎉 <@{user_id}> reached level **{level}**!"
+
+        lines = ["🎉 **Level ups!**"]
+        lines += [f"<@{user_id}> reached level **{level}**" for user_id, level in pending.levels.items()]
+        if pending.dropped:
+            lines.append(f"...and {pending.dropped} more")
+        return "\n".join(lines)[:MESSAGE_LIMIT]
+
+    async def _drain(self, channel_id: int):
+        try:
+            while True:
+                # Waiting first lets a burst pile up, and spaces sends at least window apart
+                await asyncio.sleep(self.window)
+                pending = self._pending.pop(channel_id, None)
+                if pending is None:
+                    return
+                try:
+                    await pending.channel.send(self.render(pending))
+                    self.sent += 1
+                except discord.HTTPException as e:
+                    self.failures += 1
+                    print(f"❌ Level-up announcement failed in channel {channel_id}: {e}")
+        finally:
+            self._workers.pop(channel_id, None)
+
+    async def close(self):
+        """Stop every worker; announcements not sent yet are dropped"""
+        tasks = list(self._workers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "announced": self.announced,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failures": self.failures,
+            "channels": len(self._pending),
+        }
@@ -0,0 +1,52 @@
+"""Bytes per user: dict-of-dicts level data vs ColumnarLevels
+
+Usage: python benchmarks/bench_memory.py [users]
+"""
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import ColumnarLevels
+
+def records(n: int):
+    """Random records keyed like levels.json (str snowflakes)"""
+    rng = random.Random(n)
+    for i in range(n):
+        level = rng.randint(1, 60)
+        yield str(300000000000000000 + i * 7919), {
+            "xp": rng.randint(0, 100 * level * level - 1),
+            "level": level,
+            "messages": rng.randint(0, 5000),
+            "voice_time": rng.randint(0, 3000),
+        }
+
+def measure(build):
+    """Bytes retained by the object build() returns, and the time it took"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size, elapsed
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    data, dict_bytes, dict_time = measure(lambda: dict(records(n)))
+    del data
+    columnar, col_bytes, col_time = measure(lambda: ColumnarLevels.from_dict(dict(records(n))))
+
+    print(f"{n:,} users")
+    print(f"  dict of dicts : {dict_bytes / n:7.1f} bytes/user  ({dict_bytes / 2**20:8.1f} MiB, built in {dict_time:.1f}s)")
+    print(f"  ColumnarLevels: {col_bytes / n:7.1f} bytes/user  ({col_bytes / 2**20:8.1f} MiB, built in {col_time:.1f}s)")
+    print(f"    of which columns: {columnar.nbytes() / n:.1f} bytes/user, the rest is the id -> row index")
+
+if __name__ == "__main__":
+    main()
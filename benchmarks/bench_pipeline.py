@@ -0,0 +1,255 @@
+"""Offline throughput of the message / XP / RP / leaderboard handlers
+
+Drives main.on_message, main.send_rp_action, main.get_rank and store.top
+with lightweight fake Discord objects against real level shards written to
+a temporary directory. No gateway connection is made: command dispatch
+(bot.process_commands) and name lookups are stubbed out, everything else
+is the bot's own code.
+
+Usage: python benchmarks/bench_pipeline.py [--users 10000 100000 1000000]
+           [--guilds 10] [--events 50000] [--rate 0] [--rp 0.1] [--rank 0.02]
+           [--top 0.01] [--cooldown 0] [--json results.jsonl]
+
+Each size runs in its own process so peak memory is per size. One JSON
+object per size is printed (and appended to --json), for comparing versions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from leveling import level_for_xp
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# --- FAKE DISCORD OBJECTS ---
+
+class FakeUser:
+    __slots__ = ("id", "bot", "name", "display_name", "mention")
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.bot = False
+        self.name = self.display_name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.system_channel = FakeChannel(guild_id + 1)
+
+    def get_member(self, user_id):
+        return None
+
+class FakeMessage:
+    __slots__ = ("author", "guild", "channel", "content")
+
+    def __init__(self, author, guild, channel, content):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.content = content
+
+class FakeContext:
+    __slots__ = ("author", "guild", "channel", "send")
+
+    def __init__(self, author, guild, channel):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.send = channel.send
+
+# --- DATA ---
+
+def write_shards(main, users: int, guilds: int, rng: random.Random):
+    """Level shards with users spread over guilds; returns {guild_id: [user ids]}"""
+    os.makedirs(main.LEVELS_DIR, exist_ok=True)
+    members = {}
+    for g in range(guilds):
+        guild_id = 900_000_000_000_000_000 + g * 1000
+        ids = [300_000_000_000_000_000 + i for i in range(g, users, guilds)]
+        shard = {}
+        for user_id in ids:
+            xp = rng.randint(0, 400_000)
+            shard[str(user_id)] = {"xp": xp, "level": level_for_xp(xp), "messages": rng.randint(0, 5000),
+                                   "voice_time": rng.randint(0, 3000)}
+        with open(main.shard_path(guild_id), 'w', encoding='utf-8') as f:
+            json.dump(shard, f)
+        members[guild_id] = ids
+    # Shards are written in the current format, so no conversion is needed
+    open(main.LEVELS_XP_MARKER, 'w').close()
+    return members
+
+# --- RUN ---
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+async def drive(main, args, members):
+    rng = random.Random(1)
+    guilds = {guild_id: FakeGuild(guild_id) for guild_id in members}
+    channels = {guild_id: FakeChannel(guild_id + 2) for guild_id in members}
+    guild_ids = list(guilds)
+    actions = list(main.rp_catalog.actions)
+
+    start = time.perf_counter()
+    for guild_id in guild_ids:
+        await main.level_shards.acquire(guild_id)
+    load_seconds = time.perf_counter() - start
+
+    latencies = {"on_message": [], "send_rp_action": [], "get_rank": [], "top": []}
+    interval = 1 / args.rate if args.rate else 0
+    start = time.perf_counter()
+    for n in range(args.events):
+        guild_id = rng.choice(guild_ids)
+        guild, channel = guilds[guild_id], channels[guild_id]
+        author = FakeUser(rng.choice(members[guild_id]))
+        roll = rng.random()
+
+        t = time.perf_counter()
+        if roll < args.rp:
+            target = FakeUser(rng.choice(members[guild_id]))
+            await main.send_rp_action(FakeContext(author, guild, channel), rng.choice(actions), target)
+            kind = "send_rp_action"
+        elif roll < args.rp + args.rank:
+            await main.get_rank(main.level_shards.peek(guild_id), str(author.id))
+            kind = "get_rank"
+        elif roll < args.rp + args.rank + args.top:
+            await main.level_shards.peek(guild_id).top(main.LEADERBOARD_SIZE)
+            kind = "top"
+        else:
+            await main.on_message(FakeMessage(author, guild, channel, "hello there"))
+            kind = "on_message"
+        latencies[kind].append(time.perf_counter() - t)
+
+        if interval:
+            # Paced replay: sleep until this event's slot
+            delay = start + (n + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif n % 1000 == 0:
+            # Let the flushers and announcement workers run, as they would between gateway events
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    await main.level_shards.close()
+    await main.announcer.close()
+
+    handlers = {}
+    for kind, samples in latencies.items():
+        if samples:
+            handlers[kind] = {
+                "count": len(samples),
+                "p50_us": round(percentile(samples, 0.5) * 1e6, 1),
+                "p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+            }
+    return {
+        "users": args.users[0],
+        "guilds": args.guilds,
+        "events": args.events,
+        "rate": args.rate,
+        "rp_share": args.rp,
+        "backend": main.LEVELS_BACKEND,
+        "memory_layout": main.LEVELS_MEMORY,
+        "load_seconds": round(load_seconds, 3),
+        "events_per_second": round(args.events / elapsed, 1),
+        "handlers": handlers,
+        "xp_grants": main.xp_grants.total(),
+        "level_ups": main.level_ups.total(),
+        "peak_rss_mib": peak_rss_mib(),
+        "python": sys.version.split()[0],
+    }
+
+def run_one(args):
+    import main
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    # main.py resolves its data files relative to the working directory
+    os.chdir(workdir)
+
+    async def no_commands(message):
+        pass
+
+    async def no_names(user_ids, guild=None):
+        return {}
+
+    main.bot.process_commands = no_commands
+    main.name_resolver.resolve_many = no_names
+    main.message_cooldowns.window = args.cooldown
+    main.level_shards.ready.set()
+
+    members = write_shards(main, args.users[0], args.guilds, random.Random(0))
+    try:
+        result = asyncio.run(drive(main, args, members))
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--events', type=int, default=50_000)
+    parser.add_argument('--rate', type=float, default=0, help="events per second, 0 for as fast as possible")
+    parser.add_argument('--rp', type=float, default=0.1, help="share of events that are RP commands")
+    parser.add_argument('--rank', type=float, default=0.02, help="share of events that look up a rank")
+    parser.add_argument('--top', type=float, default=0.01, help="share of events that build a leaderboard")
+    parser.add_argument('--cooldown', type=float, default=0, help="message XP cooldown (0: every message earns XP)")
+    parser.add_argument('--json', help="append one JSON line per size to this file")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    if len(args.users) == 1:
+        run_one(args)
+        return
+
+    # One process per size, so each peak memory figure stands on its own
+    for users in args.users:
+        argv = [arg for arg in sys.argv[1:]]
+        start = argv.index('--users') if '--users' in argv else None
+        if start is not None:
+            end = start + 1
+            while end < len(argv) and not argv[end].startswith('--'):
+                end += 1
+            del argv[start:end]
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--users', str(users), *argv], check=True)
+
+if __name__ == "__main__":
+    main()
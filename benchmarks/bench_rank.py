@@ -0,0 +1,91 @@
+"""Compare the old sort-based get_rank/top with RankIndex
+
+Usage: python benchmarks/bench_rank.py [sizes...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rank_index import RankIndex
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+def make_users(n: int):
+    """Random level data shaped like levels.json"""
+    rng = random.Random(n)
+    users = {}
+    for i in range(n):
+        level = rng.randint(1, 60)
+        users[str(100000000000000000 + i)] = {
+            "xp": rng.randint(0, 100 * level * level - 1),
+            "level": level,
+            "messages": rng.randint(0, 5000),
+            "voice_time": rng.randint(0, 3000),
+        }
+    return users
+
+def sort_rank(users, user_id):
+    """The original get_rank(): full sort, then a linear scan"""
+    sorted_users = sorted(users.items(), key=lambda x: (x[1]["level"], x[1]["xp"]), reverse=True)
+    for i, (uid, _) in enumerate(sorted_users, 1):
+        if uid == user_id:
+            return i
+    return len(sorted_users) + 1
+
+def sort_top(users, limit):
+    """The original !top: full sort, then a slice"""
+    return sorted(users.items(), key=lambda x: (x[1]["level"], x[1]["xp"]), reverse=True)[:limit]
+
+def timed(func, repeat):
+    """Average seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def run(n: int):
+    users = make_users(n)
+    ids = list(users)
+    rng = random.Random(0)
+    probes = [rng.choice(ids) for _ in range(1000)]
+    sort_repeat = 3 if n >= 1_000_000 else 10
+
+    start = time.perf_counter()
+    index = RankIndex(users)
+    build = time.perf_counter() - start
+
+    sort_rank_s = timed(lambda: sort_rank(users, probes[0]), sort_repeat)
+    sort_top_s = timed(lambda: sort_top(users, 10), sort_repeat)
+
+    def index_rank():
+        record = users[rng.choice(probes)]
+        return index.rank(record["level"], record["xp"])
+    index_rank_s = timed(index_rank, 10000)
+    index_top_s = timed(lambda: index.top(10), 10000)
+
+    def grant():
+        uid = rng.choice(probes)
+        users[uid]["xp"] += 15
+        index.update(uid, users[uid])
+    update_s = timed(grant, 10000)
+
+    # Both must agree on the leaderboard scores (ties may be ordered differently)
+    def scores(uids):
+        return [(users[uid]["level"], users[uid]["xp"]) for uid in uids]
+    assert scores(uid for uid, _ in sort_top(users, 10)) == scores(index.top(10))
+
+    print(f"{n:>9,} users | build {build * 1000:8.1f}ms | "
+          f"rank: sort {sort_rank_s * 1000:9.2f}ms  index {index_rank_s * 1e6:6.2f}µs | "
+          f"top10: sort {sort_top_s * 1000:9.2f}ms  index {index_top_s * 1e6:6.2f}µs | "
+          f"update {update_s * 1e6:6.2f}µs")
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for n in sizes:
+        run(n)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""Voice churn simulator for on_voice_state_update and the voice XP tracker
+
+Thousands of fake members join, move between, mute in and leave voice
+channels, including whole channels emptying and refilling at once, while a
+virtual clock makes hours of voice time pass in seconds. Events go through
+main.on_voice_state_update and settles through VoiceTracker.settle into
+real level shards in a temporary directory.
+
+An independent model of the same churn works out how much voice time each
+member should have earned, which is checked against what ended up in the
+level stores. Bots, and a share of users, are members of several guilds
+and sit in voice in more than one of them at once; every (guild, member)
+pair is accounted on its own.
+  - over_awarded: members credited more whole minutes than they sat in a
+    channel with company (time counted twice)
+  - under_awarded: members short by more than the sub-minute remainder each
+    settle period is allowed to drop
+  - bad_xp: members whose XP is not 5 per credited minute
+
+Usage: python benchmarks/sim_voice.py [--members 5000] [--guilds 5]
+           [--channels 20] [--hours 4] [--step 5] [--events 40]
+           [--bots 0.02] [--multi 0.1] [--burst 0.002] [--reconnect 60]
+           [--json results.jsonl]
+
+Exits with status 1 if any incident was found, so it can gate regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# --- VIRTUAL CLOCK ---
+
+class VirtualClock:
+    """Time that only moves when the simulation advances it"""
+    def __init__(self, start: float):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+# --- FAKE DISCORD OBJECTS ---
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.system_channel = FakeChannel(guild_id + 1)
+
+class FakeMember:
+    """A user's membership in one guild (one per guild, like discord.Member)"""
+    __slots__ = ("id", "guild", "bot", "state")
+
+    def __init__(self, member_id: int, guild: FakeGuild, bot: bool):
+        self.id = member_id
+        self.guild = guild
+        self.bot = bot
+        self.state = FakeVoiceState(None)
+
+class FakeVoiceState:
+    __slots__ = ("channel", "self_mute")
+
+    def __init__(self, channel, self_mute: bool = False):
+        self.channel = channel
+        self.self_mute = self_mute
+
+# --- REFERENCE MODEL ---
+
+class Expected:
+    """Eligible voice seconds per (guild_id, member_id), computed independently of VoiceTracker
+
+    Each channel accumulates the time it spent with two or more people in
+    it; a member earns the difference between that total when they leave
+    and when they joined.
+    """
+    def __init__(self):
+        self.occupants = {}
+        self.social = {}
+        self.entered = {}
+        self.seconds = {}
+        self.closed = {}
+
+    def advance(self, seconds: float):
+        for channel_id, members in self.occupants.items():
+            if len(members) >= 2:
+                self.social[channel_id] = self.social.get(channel_id, 0) + seconds
+
+    def join(self, member: FakeMember, channel_id: int):
+        key = (member.guild.id, member.id)
+        self.occupants.setdefault(channel_id, set()).add(key)
+        self.entered[key] = self.social.get(channel_id, 0)
+
+    def leave(self, member: FakeMember, channel_id: int):
+        key = (member.guild.id, member.id)
+        self.occupants[channel_id].discard(key)
+        earned = self.social.get(channel_id, 0) - self.entered.pop(key)
+        if not member.bot:
+            self.seconds[key] = self.seconds.get(key, 0) + earned
+
+# --- SIMULATION ---
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def latency_summary(samples):
+    return {
+        "count": len(samples),
+        "p50_us": round(percentile(samples, 0.5) * 1e6, 1) if samples else None,
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 1) if samples else None,
+        "max_us": round(max(samples) * 1e6, 1) if samples else None,
+    }
+
+async def simulate(main, args, clock):
+    rng = random.Random(args.seed)
+    tracker = main.voice_tracker
+    expected = Expected()
+
+    guilds = [FakeGuild(900_000_000_000_000_000 + g * 1000) for g in range(args.guilds)]
+    guild_by_id = {guild.id: guild for guild in guilds}
+    main.bot.get_guild = guild_by_id.get
+    channels = {guild.id: [FakeChannel(guild.id + 10 + c) for c in range(args.channels)] for guild in guilds}
+    members = []
+    for i in range(args.members):
+        user_id = 300_000_000_000_000_000 + i
+        bot = rng.random() < args.bots
+        # Bots (music bots and the like) are in every guild, some users in several
+        if bot:
+            joined = guilds
+        elif rng.random() < args.multi:
+            joined = rng.sample(guilds, rng.randint(2, len(guilds))) if len(guilds) > 1 else guilds
+        else:
+            joined = [guilds[i % len(guilds)]]
+        members.extend(FakeMember(user_id, guild, bot) for guild in joined)
+    sessions_closed = {}
+
+    handler_latency = []
+    settle_latency = []
+    task_samples = []
+    counts = {"join": 0, "move": 0, "mute": 0, "leave": 0, "bursts": 0, "reconnects": 0}
+
+    async def update(member, after_channel, self_mute=False):
+        before = member.state
+        after = FakeVoiceState(after_channel, self_mute)
+        if before.channel is not None and before.channel is not after_channel:
+            expected.leave(member, before.channel.id)
+            key = (member.guild.id, member.id)
+            sessions_closed[key] = sessions_closed.get(key, 0) + 1
+        if after_channel is not None and before.channel is not after_channel:
+            expected.join(member, after_channel.id)
+        member.state = after
+
+        start = time.perf_counter()
+        await main.on_voice_state_update(member, before, after)
+        handler_latency.append(time.perf_counter() - start)
+
+    async def settle():
+        start = time.perf_counter()
+        await tracker.settle()
+        settle_latency.append(time.perf_counter() - start)
+
+    steps = int(args.hours * 3600 / args.step)
+    settle_every = max(1, int(tracker.settle_interval / args.step))
+    reconnect_every = int(args.reconnect * 60 / args.step) if args.reconnect else 0
+    wall_start = time.perf_counter()
+
+    for step in range(1, steps + 1):
+        clock.advance(args.step)
+        expected.advance(args.step)
+
+        for _ in range(args.events):
+            member = rng.choice(members)
+            channel = member.state.channel
+            roll = rng.random()
+            if channel is None:
+                counts["join"] += 1
+                await update(member, rng.choice(channels[member.guild.id]))
+            elif roll < 0.3:
+                counts["leave"] += 1
+                await update(member, None)
+            elif roll < 0.6:
+                counts["move"] += 1
+                await update(member, rng.choice(channels[member.guild.id]))
+            else:
+                counts["mute"] += 1
+                await update(member, channel, not member.state.self_mute)
+
+        if rng.random() < args.burst:
+            # A stage event ends: one channel empties at once, and its crowd comes back a step later
+            counts["bursts"] += 1
+            guild = rng.choice(guilds)
+            channel = rng.choice(channels[guild.id])
+            crowd = [member for member in members if member.state.channel is channel]
+            for member in crowd:
+                await update(member, None)
+            clock.advance(args.step)
+            expected.advance(args.step)
+            for member in crowd:
+                await update(member, channel)
+
+        if reconnect_every and step % reconnect_every == 0:
+            # Gateway drop: nothing is dispatched for a while, then sessions are rebuilt from the cache
+            counts["reconnects"] += 1
+            await main.on_disconnect()
+            clock.advance(args.step * 6)
+            expected.advance(args.step * 6)
+            tracker.rebuild(
+                (member.id, member.guild.id, member.state.channel.id, member.bot)
+                for member in members if member.state.channel is not None
+            )
+
+        if step % settle_every == 0:
+            await settle()
+            # Let the level store flushers and announcement workers run
+            await asyncio.sleep(0)
+        task_samples.append(len(asyncio.all_tasks()))
+
+    # Everyone goes home, then the last settle collects what is left
+    for member in members:
+        if member.state.channel is not None:
+            await update(member, None)
+    await settle()
+    wall = time.perf_counter() - wall_start
+
+    # --- Compare with the reference model ---
+    over = under = bad_xp = 0
+    granted_minutes = expected_minutes = 0
+    worst_over = []
+    for member in members:
+        if member.bot:
+            continue
+        store = main.level_shards.peek(member.guild.id)
+        record = store.data.get(str(member.id)) if store is not None else None
+        minutes = record["voice_time"] if record else 0
+        xp = record["xp"] if record else 0
+        key = (member.guild.id, member.id)
+        should = int(expected.seconds.get(key, 0) // 60)
+        granted_minutes += minutes
+        expected_minutes += should
+        if minutes > should:
+            over += 1
+            worst_over.append((minutes - should, member.guild.id, member.id))
+        # Each settle period may drop one sub-minute remainder of closed sessions
+        elif should - minutes > sessions_closed.get(key, 0):
+            under += 1
+        if xp != 5 * minutes:
+            bad_xp += 1
+
+    live_tasks = len(asyncio.all_tasks())
+    await main.announcer.close()
+    await main.level_shards.close()
+
+    return {
+        "members": args.members,
+        "memberships": len(members),
+        "guilds": args.guilds,
+        "channels": args.guilds * args.channels,
+        "virtual_hours": args.hours,
+        "wall_seconds": round(wall, 2),
+        "speedup": round(args.hours * 3600 / wall, 1),
+        "events": counts,
+        "handler": latency_summary(handler_latency),
+        "settle": latency_summary(settle_latency),
+        "tasks": {"peak": max(task_samples, default=0), "final": live_tasks},
+        "granted_minutes": granted_minutes,
+        "expected_minutes": expected_minutes,
+        "granted_xp": 5 * granted_minutes,
+        "over_awarded": over,
+        "worst_over": sorted(worst_over, reverse=True)[:5],
+        "under_awarded": under,
+        "bad_xp": bad_xp,
+        "announcements": main.announcer.stats(),
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--channels', type=int, default=20, help="voice channels per guild")
+    parser.add_argument('--hours', type=float, default=4, help="virtual time to simulate")
+    parser.add_argument('--step', type=int, default=5, help="virtual seconds per tick")
+    parser.add_argument('--events', type=int, default=40, help="voice state updates per tick")
+    parser.add_argument('--bots', type=float, default=0.02, help="share of members that are bots")
+    parser.add_argument('--multi', type=float, default=0.1, help="share of users in several guilds")
+    parser.add_argument('--burst', type=float, default=0.002, help="chance per tick of a channel emptying at once")
+    parser.add_argument('--reconnect', type=float, default=60, help="virtual minutes between gateway drops (0: never)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="append the result as one JSON line to this file")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    import main
+    workdir = tempfile.mkdtemp(prefix="sim_voice_")
+    # main.py resolves its data files relative to the working directory
+    os.chdir(workdir)
+
+    async def no_names(user_ids, guild=None):
+        return {}
+
+    clock = VirtualClock(time.time())
+    main.voice_tracker.clock = clock
+    main.voice_tracker.path = os.path.join(workdir, 'voice_sessions.json')
+    main.name_resolver.resolve_many = no_names
+    main.level_shards.ready.set()
+    os.makedirs(main.LEVELS_DIR, exist_ok=True)
+    open(main.LEVELS_XP_MARKER, 'w').close()
+
+    try:
+        result = asyncio.run(simulate(main, args, clock))
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(result))
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+    if result["over_awarded"] or result["under_awarded"] or result["bad_xp"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
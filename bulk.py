@@ -0,0 +1,201 @@
+import asyncio
+from typing import Awaitable, Callable, Collection, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from columnar import ColumnarLevels
+from leveling import MAX_LEVEL, xp_for_level
+from rank_index import RankIndex
+
+# Rows written per flush while saving a bulk change
+CHUNK_SIZE = 20_000
+
+# XP is stored as signed 64-bit integers
+XP_MAX = 2 ** 63 - 1
+
+class BulkRangeError(ValueError):
+    """A bulk operation would push XP out of the stored integer range"""
+
+# --- VECTORIZED OPERATIONS ---
+#
+# Each operation maps the XP column to a new XP column; levels are then
+# recomputed from it in one searchsorted pass.
+
+def scale_xp(xp, factor: float):
+    # The product is a float64, and casting 2**63 or more back to int64 wraps silently
+    if not -float(XP_MAX) <= factor <= float(XP_MAX) or (xp.size and float(xp.max()) * factor >= 2.0 ** 63):
+        raise BulkRangeError(f"Scaling by {factor:g} would overflow the highest XP")
+    return np.floor(xp * factor).astype(np.int64)
+
+def add_xp(xp, amount: int):
+    if not -XP_MAX <= amount <= XP_MAX or (xp.size and int(xp.max()) + amount > XP_MAX):
+        raise BulkRangeError(f"Adding {amount:,} XP would overflow the highest XP")
+    return xp + amount
+
+def reset_xp(xp):
+    return np.zeros_like(xp)
+
+def keep_xp(xp):
+    return xp
+
+BULK_OPERATIONS = {
+    "scale": scale_xp,
+    "add": add_xp,
+    "reset": reset_xp,
+    "recompute": keep_xp,
+}
+
+def parse_bulk_args(operation: str, value: Optional[str] = None, confirm: Optional[str] = None) -> Tuple:
+    """Arguments of an operation from command text; raises ValueError if they are invalid
+
+    Operations that wipe everyone (reset, or scaling by zero or less) need
+    an explicit "confirm".
+    """
+    if operation == "scale":
+        factor = float(value) if value is not None else None
+        if factor is None or not -XP_MAX <= factor <= XP_MAX:
+            raise ValueError(f"Invalid scale factor: {value}")
+        if factor <= 0 and confirm != "confirm":
+            raise ValueError("Scaling by zero or less needs confirm")
+        return (factor,)
+    if operation == "add":
+        amount = int(value) if value is not None else None
+        if amount is None or not -XP_MAX <= amount <= XP_MAX:
+            raise ValueError(f"Invalid XP amount: {value}")
+        return (amount,)
+    if operation == "reset" and value == "confirm":
+        return ()
+    if operation == "recompute" and value is None:
+        return ()
+    raise ValueError(f"Invalid bulk operation: {operation}")
+
+def levels_for_xp(xp):
+    """Vectorized leveling.level_for_xp"""
+    thresholds = xp_for_level(np.arange(1, MAX_LEVEL + 1, dtype=np.int64))
+    return np.clip(np.searchsorted(thresholds, xp, side='right'), 1, MAX_LEVEL)
+
+def apply_operation(xp, operation: str, *args) -> Tuple:
+    """(new xp, new level) columns; XP never goes below zero"""
+    new_xp = np.maximum(BULK_OPERATIONS[operation](xp, *args), 0)
+    return new_xp, levels_for_xp(new_xp)
+
+# --- COLUMN ACCESS ---
+
+def snapshot_columns(data) -> Tuple:
+    """What a bulk pass reads, taken on the event loop
+
+    The columnar layout copies its columns (one buffer copy each, and no
+    buffer export pins them while the bot keeps running). The dict layout
+    only lists its ids and records; their values are read in the worker
+    thread, and records changed meanwhile are redone when the result is
+    swapped in.
+    """
+    if isinstance(data, ColumnarLevels):
+        ids = np.frombuffer(data.ids(), dtype=np.uint64).copy()
+        xp = np.frombuffer(data.column("xp"), dtype=np.int64).copy()
+        level = np.frombuffer(data.column("level"), dtype=data.column("level").typecode).copy()
+        return ids, xp, level
+    return list(data), list(data.values())
+
+def read_columns(snapshot: Tuple) -> Tuple:
+    """(ids, xp, level) of every record in a snapshot as arrays, in iteration order"""
+    if len(snapshot) == 3:
+        return snapshot
+    ids, records = snapshot
+    xp = np.fromiter((record["xp"] for record in records), dtype=np.int64, count=len(ids))
+    level = np.fromiter((record["level"] for record in records), dtype=np.int64, count=len(ids))
+    return ids, xp, level
+
+def write_columns(data, ids, xp, level, rows, skip: Collection[str] = ()) -> List[str]:
+    """Store new xp/level values for the given row positions, except for user ids in skip
+
+    Returns the user ids that were written.
+    """
+    if isinstance(data, ColumnarLevels):
+        if skip:
+            rows = rows[~np.isin(ids[rows], np.array([int(uid) for uid in skip], dtype=np.uint64))]
+        np.frombuffer(data.column("xp"), dtype=np.int64)[rows] = xp[rows]
+        np.frombuffer(data.column("level"), dtype=data.column("level").typecode)[rows] = level[rows]
+        return [str(uid) for uid in ids[rows].tolist()]
+
+    changed = []
+    for row, new_xp, new_level in zip(rows.tolist(), xp[rows].tolist(), level[rows].tolist()):
+        user_id = ids[row]
+        if user_id in skip:
+            continue
+        record = data[user_id]
+        record["xp"] = new_xp
+        record["level"] = new_level
+        changed.append(user_id)
+    return changed
+
+def rank_keys(ids, xp, level) -> List[Tuple[int, int, str]]:
+    """RankIndex keys for every row, pre-sorted by (level, xp) so indexing them is cheap"""
+    order = np.lexsort((xp, level))
+    if isinstance(ids, np.ndarray):
+        user_ids = [str(uid) for uid in ids[order].tolist()]
+    else:
+        user_ids = [ids[row] for row in order.tolist()]
+    return list(zip(level[order].tolist(), xp[order].tolist(), user_ids))
+
+def compute_bulk(snapshot: Tuple, operation: str, *args) -> Tuple:
+    """Run one operation over a snapshot without touching the store (runs in a worker thread)
+
+    Returns (ids, new xp, new level, changed rows, rank index of the
+    result). Raises BulkRangeError if the result would not fit the stored
+    XP.
+    """
+    ids, xp, level = read_columns(snapshot)
+    new_xp, new_level = apply_operation(xp, operation, *args)
+    rows = np.flatnonzero((new_xp != xp) | (new_level != level))
+    return ids, new_xp, new_level, rows, RankIndex.from_keys(rank_keys(ids, new_xp, new_level))
+
+# --- SAVING ---
+
+async def run_bulk(store, operation: str, *args, chunk_size: int = CHUNK_SIZE,
+                   progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> int:
+    """Apply a bulk operation to a store and save the changed records in chunks
+
+    The column math and the rank index rebuild run in a worker thread on a
+    snapshot, while the store keeps serving events. The result is then
+    swapped in without awaiting; records whose XP changed in the meantime
+    get the operation again from their current values, so no concurrent
+    grant is lost. Nothing is changed if BulkRangeError is raised. Each
+    chunk is flushed before the next is queued, and progress(saved, total)
+    is awaited after each chunk. Returns the number of changed users.
+    """
+    if np is None:
+        raise RuntimeError("Bulk level operations need NumPy (pip install numpy)")
+
+    loop = asyncio.get_running_loop()
+    data = store.data
+    store.touched = set()
+    try:
+        snapshot = snapshot_columns(data)
+        ids, xp, level, rows, ranks = await loop.run_in_executor(None, compute_bulk, snapshot, operation, *args)
+        touched = list(store.touched)
+        current = np.fromiter((data[uid]["xp"] for uid in touched), dtype=np.int64, count=len(touched))
+        redo_xp, redo_level = apply_operation(current, operation, *args)
+    finally:
+        store.touched = None
+
+    changed = write_columns(data, ids, xp, level, rows, skip=set(touched))
+    for user_id, new_xp, new_level in zip(touched, redo_xp.tolist(), redo_level.tolist()):
+        record = data[user_id]
+        if record["xp"] != new_xp or record["level"] != new_level:
+            record["xp"] = new_xp
+            record["level"] = new_level
+            changed.append(user_id)
+        ranks.update(user_id, record)
+    store.rebuild_ranks(ranks)
+
+    for offset in range(0, len(changed), chunk_size):
+        for user_id in changed[offset:offset + chunk_size]:
+            store.mark_dirty(user_id, reindex=False)
+        await store.flush()
+        if progress is not None:
+            await progress(min(offset + chunk_size, len(changed)), len(changed))
+    return len(changed)
@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+# --- TTL + LRU CACHE ---
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after ttl seconds"""
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh value and mark it as recently used"""
+        entry = self._items.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        value, expires = entry
+        if expires <= time.monotonic():
+            del self._items[key]
+            self.misses += 1
+            return default
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry if full"""
+        self._items[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._items.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._items.get(key, _MISSING)
+        return entry is not _MISSING and entry[1] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# --- COOLDOWNS ---
+
+class CooldownStore:
+    """Fixed-window cooldowns with expiry and a hard size cap
+
+    Every entry lives for the same window, so insertion order is expiry
+    order: expired entries are dropped from the front of the OrderedDict
+    in amortized O(1), and the cap evicts the entry that expires first.
+    """
+    def __init__(self, window: float, maxsize: int = 100_000, clock=time.monotonic):
+        self.window = window
+        self.maxsize = maxsize
+        self.clock = clock
+        self._expires: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.evictions = 0
+
+    def _prune(self, now: float):
+        expires = self._expires
+        while expires:
+            key, expiry = next(iter(expires.items()))
+            if expiry > now:
+                break
+            del expires[key]
+
+    def remaining(self, key: Hashable) -> float:
+        """Seconds left on a key's cooldown (0 if it is free)"""
+        expiry = self._expires.get(key)
+        if expiry is None:
+            return 0.0
+        return max(0.0, expiry - self.clock())
+
+    def try_acquire(self, key: Hashable) -> bool:
+        """Start the cooldown and return True, or return False if it is still running"""
+        now = self.clock()
+        self._prune(now)
+        if key in self._expires:
+            return False
+
+        self._expires[key] = now + self.window
+        if len(self._expires) > self.maxsize:
+            self._expires.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def __len__(self) -> int:
+        return len(self._expires)
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# --- SHARD LAYOUT ---
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shard ids 0..shard_count-1 into contiguous ranges, one per process"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+# --- CLUSTER-WIDE STATS ---
+
+class ClusterStats:
+    """Per-process counters shared through one SQLite table
+
+    Every process upserts its own row every interval seconds; any process
+    can read the whole table to report cluster-wide totals. Rows that have
+    not been refreshed for stale_after seconds belong to processes that are
+    down and are left out of the totals.
+    """
+    def __init__(self, path: str, cluster_id: int, shard_ids: Optional[List[int]],
+                 collect: Callable[[], Dict[str, Any]], interval: float = 60.0):
+        self.path = path
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.collect = collect
+        self.interval = interval
+        self.stale_after = interval * 3
+        self._task: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cluster_stats ('
+            'cluster_id INTEGER PRIMARY KEY, shard_ids TEXT NOT NULL, '
+            'updated REAL NOT NULL, stats TEXT NOT NULL)'
+        )
+        return conn
+
+    def _write(self, stats: Dict[str, Any]):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO cluster_stats (cluster_id, shard_ids, updated, stats) VALUES (?, ?, ?, ?)',
+                    (self.cluster_id, json.dumps(self.shard_ids), time.time(), json.dumps(stats))
+                )
+        finally:
+            conn.close()
+
+    def _read(self) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT cluster_id, shard_ids, updated, stats FROM cluster_stats ORDER BY cluster_id'
+            ).fetchall()
+        finally:
+            conn.close()
+
+        now = time.time()
+        return [
+            {"cluster_id": cluster_id, "shard_ids": json.loads(shard_ids),
+             "age": now - updated, "alive": now - updated <= self.stale_after, **json.loads(stats)}
+            for cluster_id, shard_ids, updated, stats in rows
+        ]
+
+    async def publish(self):
+        """Write this process's current counters"""
+        stats = self.collect()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, stats)
+
+    async def processes(self) -> List[Dict[str, Any]]:
+        """Latest row of every process, stale ones flagged with alive=False"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read)
+
+    async def totals(self) -> Dict[str, Any]:
+        """Numeric counters summed over the processes that are alive"""
+        rows = [row for row in await self.processes() if row["alive"]]
+        totals: Dict[str, Any] = {"processes": len(rows)}
+        for row in rows:
+            for key, value in row.items():
+                if key not in ("cluster_id", "age", "alive") and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.publish()
+            except Exception as e:
+                print(f"❌ Failed to publish cluster stats: {e}")
+
+    def start(self):
+        """Start publishing periodically (must be called from a running loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,142 @@
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Iterator, Union
+
+# Column typecodes: user ids are unsigned 64-bit snowflakes, counters signed 64-bit
+FIELD_TYPES = {"xp": 'q', "level": 'i', "messages": 'q', "voice_time": 'q'}
+
+UserKey = Union[str, int]
+
+# --- RECORD VIEW ---
+
+class RecordView(MutableMapping):
+    """Dict-like window onto one row of a ColumnarLevels store"""
+    __slots__ = ("_columns", "_row")
+
+    def __init__(self, columns: Dict[str, array], row: int):
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, field: str) -> int:
+        return self._columns[field][self._row]
+
+    def __setitem__(self, field: str, value: int):
+        self._columns[field][self._row] = value
+
+    def __delitem__(self, field: str):
+        raise TypeError("Level records have a fixed set of fields")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELD_TYPES)
+
+    def __len__(self) -> int:
+        return len(FIELD_TYPES)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+# --- COLUMNAR LEVEL DATA ---
+
+class ColumnarLevels(MutableMapping):
+    """Level data as parallel fixed-width integer columns
+
+    A drop-in replacement for the {user_id: {"xp": ..., ...}} dict: keys can
+    be given as str or int and are iterated as str, values are RecordView
+    objects that read and write the columns in place.
+    """
+    def __init__(self):
+        self._ids = array('Q')
+        self._columns: Dict[str, array] = {field: array(code) for field, code in FIELD_TYPES.items()}
+        self._rows: Dict[int, int] = {}
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "ColumnarLevels":
+        """Build from a loaded levels dict"""
+        store = cls()
+        for user_id, record in data.items():
+            store[user_id] = record
+        return store
+
+    def extend_columns(self, ids: array, columns: Mapping[str, array]):
+        """Add users given as whole columns (ids with one value per field each)
+
+        An empty store takes the columns as they are; otherwise, or if ids
+        repeat, every row is upserted on its own.
+        """
+        if not self._ids:
+            rows = dict(zip(ids, range(len(ids))))
+            if len(rows) == len(ids):
+                self._rows = rows
+                self._ids.extend(ids)
+                for field, column in self._columns.items():
+                    column.extend(columns[field])
+                return
+        for row, user_id in enumerate(ids):
+            self[user_id] = {field: values[row] for field, values in columns.items()}
+
+    def _row(self, user_id: UserKey) -> int:
+        try:
+            return self._rows[int(user_id)]
+        except ValueError:
+            raise KeyError(user_id) from None
+
+    def __getitem__(self, user_id: UserKey) -> RecordView:
+        return RecordView(self._columns, self._row(user_id))
+
+    def __setitem__(self, user_id: UserKey, record: Mapping):
+        key = int(user_id)
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self._ids)
+            self._ids.append(key)
+            for field, column in self._columns.items():
+                column.append(record.get(field, 1 if field == "level" else 0))
+        else:
+            for field, column in self._columns.items():
+                column[row] = record.get(field, column[row])
+
+    def __delitem__(self, user_id: UserKey):
+        # Move the last row into the hole so the columns stay dense
+        key = int(user_id)
+        row = self._rows.pop(key)
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            self._ids[row] = moved
+            for column in self._columns.values():
+                column[row] = column[last]
+            self._rows[moved] = row
+        self._ids.pop()
+        for column in self._columns.values():
+            column.pop()
+
+    def __contains__(self, user_id) -> bool:
+        try:
+            return int(user_id) in self._rows
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(user_id) for user_id in self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def copy(self) -> "ColumnarLevels":
+        """Independent copy; the columns are copied as whole buffers"""
+        clone = ColumnarLevels()
+        clone._ids = array('Q', self._ids)
+        clone._columns = {field: array(column.typecode, column) for field, column in self._columns.items()}
+        clone._rows = self._rows.copy()
+        return clone
+
+    def column(self, field: str) -> array:
+        """Raw column, in row order (matching ids())"""
+        return self._columns[field]
+
+    def ids(self) -> array:
+        return self._ids
+
+    def nbytes(self) -> int:
+        """Bytes used by the column buffers (the id index not included)"""
+        return sum(col.itemsize * len(col) for col in [self._ids, *self._columns.values()])
@@ -0,0 +1,102 @@
+"""Run the bot as several processes, each owning a range of gateway shards
+
+Usage: python launcher.py [processes]
+
+The shard count comes from SHARD_COUNT or, if unset, from Discord's
+recommendation. Each worker is main.py started with SHARD_COUNT, SHARD_IDS
+and CLUSTER_ID set; workers that exit are restarted. Level data is shared
+through the files in LEVELS_DIR or the LEVELS_DB SQLite file, which is safe
+because a guild lives on exactly one shard and so in exactly one process.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import discord
+from dotenv import load_dotenv
+
+from cluster import shard_ranges
+
+# Discord allows one IDENTIFY per 5 seconds (max_concurrency 1)
+IDENTIFY_INTERVAL = 5.0
+
+# Wait this long before restarting a worker that exited
+RESTART_DELAY = 10.0
+
+async def recommended_shards(token: str) -> int:
+    """Shard count Discord recommends for this bot"""
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _, _ = await http.get_bot_gateway()
+        return shards
+    finally:
+        await http.close()
+
+def spawn(cluster_id: int, shard_ids, shard_count: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        CLUSTER_ID=str(cluster_id),
+        SHARD_COUNT=str(shard_count),
+        SHARD_IDS=",".join(map(str, shard_ids)),
+    )
+    print(f"🚀 Starting cluster {cluster_id} with shards {shard_ids[0]}-{shard_ids[-1]}")
+    return subprocess.Popen([sys.executable, "main.py"], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    load_dotenv()
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        print("❌ ERROR: Token not found!")
+        return
+
+    # Level storage settings live in main.py (importing it builds the bot but does not start it)
+    from main import LEVELS_DB, LEVELS_DIR, LEVELS_FILE, LEVELS_XP_MARKER
+    from shards import has_global_levels
+    from storage import convert_to_cumulative_xp
+
+    if has_global_levels(LEVELS_FILE, LEVELS_DB):
+        # The split needs every guild's member list, which no single worker has
+        print(f"❌ {LEVELS_FILE} (or the global table in {LEVELS_DB}) has not been split into guild shards yet: "
+              "start main.py once on its own first")
+        return
+    if not os.path.exists(LEVELS_XP_MARKER):
+        os.makedirs(LEVELS_DIR, exist_ok=True)
+        converted = convert_to_cumulative_xp(LEVELS_DIR, LEVELS_DB, LEVELS_XP_MARKER)
+        print(f"📦 Converted XP of {converted} users to cumulative totals")
+
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv('CLUSTER_PROCESSES', '2'))
+    shard_count = int(os.getenv('SHARD_COUNT', '0')) or asyncio.run(recommended_shards(token))
+    ranges = shard_ranges(shard_count, processes)
+    print(f"🌐 {shard_count} shards over {len(ranges)} processes")
+
+    workers = {}
+    try:
+        for cluster_id, shard_ids in enumerate(ranges):
+            workers[cluster_id] = spawn(cluster_id, shard_ids, shard_count)
+            # Identifies are rate limited bot-wide, so let this worker's shards connect first
+            time.sleep(IDENTIFY_INTERVAL * len(shard_ids))
+
+        while True:
+            time.sleep(1)
+            for cluster_id, worker in list(workers.items()):
+                code = worker.poll()
+                if code is not None:
+                    print(f"⚠️ Cluster {cluster_id} exited with code {code}, restarting in {RESTART_DELAY:g}s")
+                    time.sleep(RESTART_DELAY)
+                    workers[cluster_id] = spawn(cluster_id, ranges[cluster_id], shard_count)
+    except KeyboardInterrupt:
+        print("🛑 Stopping workers...")
+    finally:
+        # SIGINT lets each worker close cleanly and flush its level data
+        for worker in workers.values():
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGINT)
+        for worker in workers.values():
+            worker.wait()
+
+if __name__ == "__main__":
+    main()
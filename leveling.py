@@ -0,0 +1,30 @@
+from bisect import bisect_right
+from typing import Tuple
+
+# --- LEVEL CURVE ---
+#
+# Records store cumulative XP; the level is derived from it. Going from
+# level L to L + 1 costs 100·L² XP, so level L starts at
+# sum(100·k² for k < L) = 100·(L-1)·L·(2L-1)/6.
+
+MAX_LEVEL = 10_000
+
+def xp_to_next(level: int) -> int:
+    """XP needed to go from level to level + 1"""
+    return 100 * level * level
+
+def xp_for_level(level: int) -> int:
+    """Total XP at which a level starts"""
+    return 100 * (level - 1) * level * (2 * level - 1) // 6
+
+# _THRESHOLDS[i] is the total XP at which level i + 1 starts
+_THRESHOLDS = [xp_for_level(level) for level in range(1, MAX_LEVEL + 1)]
+
+def level_for_xp(xp: int) -> int:
+    """Level reached with a total XP, by binary search over the thresholds"""
+    return max(1, min(bisect_right(_THRESHOLDS, xp), MAX_LEVEL))
+
+def level_progress(xp: int) -> Tuple[int, int, int]:
+    """(level, XP earned within that level, XP the level takes to finish)"""
+    level = level_for_xp(xp)
+    return level, xp - xp_for_level(level), xp_to_next(level)
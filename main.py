@@ -2,12 +2,28 @@ import discord
 from discord.ext import commands
 import random
 import os
-import json
+import copy
 import datetime
 import asyncio
+import time
 from dotenv import load_dotenv
-from collections import defaultdict
 from typing import List, Dict, Any
+from storage import WriteBehindStore, convert_to_cumulative_xp, create_backend
+from shards import GuildShards, ShardUnavailable, has_global_levels, migrate_global_levels
+from names import NameResolver
+from cache import CooldownStore
+from voice import VoiceTracker
+from rp_catalog import CatalogError, load_catalog
+from leveling import level_progress
+from bulk import BulkRangeError, parse_bulk_args, run_bulk
+from announce import AnnouncementQueue
+from cluster import ClusterStats
+from metrics import IO_BUCKETS, Registry, serve as serve_metrics
+from stalls import StallWatchdog
+from members import MemberCache, MemberLookup, member_cache_settings
+
+# Process start, for the time it takes to reach on_ready
+PROCESS_STARTED = time.perf_counter()
 
 # Load environment variables
 load_dotenv()
@@ -17,389 +33,394 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)  # Отключаем встроенную команду help
+# Member cache: 'full' keeps every member of every guild; 'lean' keeps members in voice plus
+# recently active ones (LRU of MEMBER_CACHE_SIZE, expiring after MEMBER_CACHE_TTL seconds),
+# fetches others on demand and only chunks a guild when its full member list is needed
+MEMBER_CACHE = os.getenv('MEMBER_CACHE', 'full')
+MEMBER_CACHE_SIZE = int(os.getenv('MEMBER_CACHE_SIZE', '50000'))
+MEMBER_CACHE_TTL = float(os.getenv('MEMBER_CACHE_TTL', '1800'))
+
+# Messages starting with this are commands; everything else skips the command framework
+COMMAND_PREFIX = '!'
 
-# File for level data
+# Levels are stored per guild: one shard file (or SQLite table) per guild
+LEVELS_DIR = 'levels'
+
+# Old global level file, split into guild shards on first start
 LEVELS_FILE = 'levels.json'
 
-# Load level data
-def load_levels():
-    if os.path.exists(LEVELS_FILE):
-        with open(LEVELS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-# Save level data
-def save_levels(data):
-    with open(LEVELS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
-# User level data
-user_levels = load_levels()
-
-# Anti-spam tracking
-last_message_time = defaultdict(dict)
-
-# --- RP COMMANDS BY CATEGORY (24 commands total) ---
-
-rp_categories = {
-    "affection": {
-        "name": "💕 Affection",
-        "color": 0xff69b4,
-        "description": "Warm and loving actions",
-        "commands": {
-            'hug': {
-                'text': '🤗 **{author}** hugged **{target}**!',
-                'gifs': [
-                    'https://media.tenor.com/2qF4uSeT-gcAAAAC/anime-hug.gif',
-                    'https://media.tenor.com/2WUN1q7uU0EAAAAC/hug-anime.gif'
-                ]
-            },
-            'kiss': {
-                'text': '😘 **{author}** kissed **{target}**!',
-                'gifs': [
-                    'https://media.tenor.com/G4M6qVw7U8EAAAAC/anime-kiss.gif',
-                    'https://media.tenor.com/gG1yBqWqWqkAAAAC/kiss-anime.gif'
-                ]
-            },
-            'cuddle': {
-                'text': '🥰 **{author}** cuddled with **{target}**!',
-                'gifs': [
-                    'https://media.tenor.com/2xV1mRQZ0n4AAAAC/anime-cuddle.gif'
-                ]
-            },
-            'pat': {
-                'text': '😊 **{author}** patted **{target}** on the head!',
-                'gifs': [
-                    'https://media.tenor.com/BJ2y7q0tGQYAAAAC/anime-pat.gif',
-                    'https://media.tenor.com/7RX-pPpNxBkAAAAC/pat-head-pat.gif'
-                ]
-            },
-            'boop': {
-                'text': '👆 **{author}** booped **{target}**!',
-                'gifs': []
-            }
-        }
-    },
-    "playful": {
-        "name": "🎉 Playful",
-        "color": 0xffa500,
-        "description": "Fun and silly interactions",
-        "commands": {
-            'poke': {
-                'text': '👉 **{author}** poked **{target}**!',
-                'gifs': []
-            },
-            'tickle': {
-                'text': '😂 **{author}** tickled **{target}**!',
-                'gifs': []
-            },
-            'dance': {
-                'text': '💃 **{author}** danced with **{target}**!',
-                'gifs': []
-            },
-            'highfive': {
-                'text': '🖐️ **{author}** gave a high-five to **{target}**!',
-                'gifs': []
-            },
-            'wave': {
-                'text': '👋 **{author}** waved at **{target}**!',
-                'gifs': []
-            },
-            'cheer': {
-                'text': '🎉 **{author}** cheered for **{target}**!',
-                'gifs': []
-            }
-        }
-    },
-    "mischief": {
-        "name": "😈 Mischief",
-        "color": 0xff4500,
-        "description": "Playful teasing and trouble",
-        "commands": {
-            'bite': {
-                'text': '😲 **{author}** bit **{target}**!',
-                'gifs': [
-                    'https://media.tenor.com/bKQY_b9x2lIAAAAC/anime-bite.gif'
-                ]
-            },
-            'slap': {
-                'text': '👋 **{author}** slapped **{target}**!',
-                'gifs': [
-                    'https://media.tenor.com/0O9qTZ8qWqkAAAAC/anime-slap.gif'
-                ]
-            },
-            'pinch': {
-                'text': '🤏 **{author}** pinched **{target}**!',
-                'gifs': []
-            },
-            'push': {
-                'text': '👋 **{author}** pushed **{target}**!',
-                'gifs': []
-            },
-            'throw': {
-                'text': '🤾 **{author}** threw **{target}**!',
-                'gifs': []
-            }
-        }
-    },
-    "caring": {
-        "name": "💝 Caring",
-        "color": 0x98fb98,
-        "description": "Sweet and supportive actions",
-        "commands": {
-            'cookie': {
-                'text': '🍪 **{author}** gave a cookie to **{target}**!',
-                'gifs': []
-            },
-            'cake': {
-                'text': '🎂 **{author}** gave cake to **{target}**!',
-                'gifs': []
-            },
-            'coffee': {
-                'text': '☕ **{author}** gave coffee to **{target}**!',
-                'gifs': []
-            },
-            'protect': {
-                'text': '🛡️ **{author}** protected **{target}**!',
-                'gifs': []
-            },
-            'comfort': {
-                'text': '🤗 **{author}** comforted **{target}**!',
-                'gifs': []
-            }
-        }
-    },
-    "reactions": {
-        "name": "😊 Reactions",
-        "color": 0x9b59b6,
-        "description": "Express your feelings",
-        "commands": {
-            'smile': {
-                'text': '😊 **{author}** smiled at **{target}**!',
-                'gifs': []
-            },
-            'blush': {
-                'text': '😳 **{author}** blushed at **{target}**!',
-                'gifs': []
-            },
-            'cry': {
-                'text': '😢 **{author}** cried on **{target}**!',
-                'gifs': []
-            },
-            'laugh': {
-                'text': '😂 **{author}** laughed at **{target}**!',
-                'gifs': []
-            },
-            'angry': {
-                'text': '😠 **{author}** is angry at **{target}**!',
-                'gifs': []
-            }
-        }
+# Written once stored XP has been converted from per-level to cumulative
+LEVELS_XP_MARKER = os.path.join(LEVELS_DIR, '.cumulative_xp')
+
+# Unload a guild's levels after N seconds without activity
+LEVELS_IDLE_TIMEOUT = float(os.getenv('LEVELS_IDLE_TIMEOUT', '1800'))
+
+# Level storage backend: 'json' (shard .json + journal), 'binary' (shard .lvl + journal,
+# read from the .json shard until its first compaction) or 'sqlite'.
+# To switch back from binary to json, convert first: python snapshot.py to-json levels
+LEVELS_BACKEND = os.getenv('LEVELS_BACKEND', 'json')
+LEVELS_DB = os.getenv('LEVELS_DB', 'levels.db')
+
+# In-memory layout: 'dict' (one dict per user) or 'columnar' (compact integer columns)
+LEVELS_MEMORY = os.getenv('LEVELS_MEMORY', 'dict')
+
+# Write-behind settings: flush every N seconds or once N records are dirty
+LEVELS_FLUSH_INTERVAL = float(os.getenv('LEVELS_FLUSH_INTERVAL', '30'))
+LEVELS_FLUSH_THRESHOLD = int(os.getenv('LEVELS_FLUSH_THRESHOLD', '500'))
+
+# Journal compaction: fold the journal into the shard file every N seconds or N bytes
+LEVELS_COMPACT_INTERVAL = float(os.getenv('LEVELS_COMPACT_INTERVAL', '600'))
+LEVELS_COMPACT_BYTES = int(os.getenv('LEVELS_COMPACT_BYTES', str(1024 * 1024)))
+
+# Cluster mode (set by launcher.py): this process runs SHARD_IDS out of SHARD_COUNT gateway shards
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id] or None
+CLUSTER_ID = int(os.environ['CLUSTER_ID']) if os.getenv('CLUSTER_ID') else None
+
+# Cluster processes share their counters through this database
+CLUSTER_DB = os.getenv('CLUSTER_DB', 'cluster.db')
+CLUSTER_STATS_INTERVAL = float(os.getenv('CLUSTER_STATS_INTERVAL', '60'))
+
+# Open voice sessions are saved here and settled into XP every N seconds
+VOICE_SESSIONS_FILE = 'voice_sessions.json' if CLUSTER_ID is None else f'voice_sessions.{CLUSTER_ID}.json'
+VOICE_SETTLE_INTERVAL = float(os.getenv('VOICE_SETTLE_INTERVAL', '300'))
+
+# Level-ups within N seconds in one channel are announced in a single message
+LEVELUP_ANNOUNCE_WINDOW = float(os.getenv('LEVELUP_ANNOUNCE_WINDOW', '2'))
+
+# RP categories and actions; edit the file and run !rpreload to apply
+RP_CATALOG_FILE = 'rp_actions.json'
+
+# Prometheus metrics on http://127.0.0.1:METRICS_PORT/metrics (0 disables; cluster workers add their CLUSTER_ID)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Opt-in event loop watchdog: log stalls longer than N ms with the code that caused them (0 disables)
+STALL_THRESHOLD_MS = float(os.getenv('STALL_THRESHOLD_MS', '0'))
+
+# --- METRICS ---
+
+metrics = Registry()
+command_latency = metrics.histogram(
+    'bot_command_duration_seconds', 'Time to run a command, Discord calls included', labels=('command',)
+)
+command_errors = metrics.counter('bot_command_errors_total', 'Commands that ended in an error', ('command',))
+messages_seen = metrics.counter('bot_messages_total', 'Messages seen from users (not bots)')
+xp_grants = metrics.counter('bot_xp_grants_total', 'Users granted XP, by source', ('source',))
+xp_granted = metrics.counter('bot_xp_granted_total', 'XP handed out, by source', ('source',))
+level_ups = metrics.counter('bot_level_ups_total', 'Level-ups, by source', ('source',))
+
+# Message ingestion stages: filter (bots, prefix), xp (cooldown and store), commands (dispatch and run).
+# Seconds divided by messages is the mean cost of a stage per message.
+ingest_messages = metrics.counter('bot_ingest_messages_total', 'Messages that went through each ingestion stage', ('stage',))
+ingest_seconds = metrics.counter('bot_ingest_seconds_total', 'Time spent in each ingestion stage', ('stage',))
+INGEST_STAGES = ("filter", "xp", "commands")
+store_io = metrics.histogram(
+    'bot_level_store_io_seconds', 'Level store load, flush and compaction durations', IO_BUCKETS, ('operation',)
+)
+
+def observe_store_io(operation, seconds):
+    store_io.observe(seconds, operation=operation)
+
+loop_stalls = metrics.histogram(
+    'bot_event_loop_stall_seconds', 'Event loop stalls over STALL_THRESHOLD_MS',
+    (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+stall_watchdog = None
+if STALL_THRESHOLD_MS:
+    stall_watchdog = StallWatchdog(STALL_THRESHOLD_MS / 1000, on_stall=lambda lag, location: loop_stalls.observe(lag))
+    metrics.gauge('bot_event_loop_max_lag_seconds', 'Worst event loop lag seen', lambda: stall_watchdog.max_lag)
+
+def shard_path(guild_id):
+    """JSON shard file of a guild"""
+    return os.path.join(LEVELS_DIR, f'{guild_id}.json')
+
+def open_level_store(guild_id):
+    """Load one guild's levels (runs in a worker thread)"""
+    os.makedirs(LEVELS_DIR, exist_ok=True)
+    start = time.perf_counter()
+    # Level data is kept in memory and written to the backend in batches
+    store = WriteBehindStore(
+        create_backend(LEVELS_BACKEND, shard_path(guild_id), LEVELS_DB, table=f'levels_{guild_id}'),
+        LEVELS_FLUSH_INTERVAL,
+        LEVELS_FLUSH_THRESHOLD,
+        LEVELS_COMPACT_INTERVAL,
+        LEVELS_COMPACT_BYTES,
+        columnar=LEVELS_MEMORY == 'columnar',
+        on_timing=observe_store_io
+    )
+    observe_store_io("load", time.perf_counter() - start)
+    return store
+
+# Fire-and-forget tasks; the loop only keeps weak references, so they are held here until done
+background_tasks = set()
+
+def _background_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Background task {task.get_name()} failed: {task.exception()}")
+
+def run_in_background(coro, name=None):
+    """Start a task that nobody awaits, keeping it alive and logging its failure"""
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+def on_shard_load(guild_id, store):
+    # Pre-warm leaderboard names so the guild's first !top is instant
+    guild = bot.get_guild(guild_id)
+    leaders = store.ranks.top(LEADERBOARD_SIZE)
+    run_in_background(name_resolver.resolve_many(leaders, guild), name=f"prewarm-names-{guild_id}")
+
+# Guild level stores, loaded lazily and unloaded when idle
+level_shards = GuildShards(open_level_store, LEVELS_IDLE_TIMEOUT, on_load=on_shard_load)
+
+class LevelBot(commands.AutoShardedBot):
+    """Bot that owns the background persistence tasks"""
+    def __init__(self, *args, **kwargs):
+        # Bumped on every command change so cached menus know to rebuild
+        self.command_version = 0
+        self.metrics_server = None
+        # Seconds from process start to the first on_ready
+        self.startup_seconds = None
+        # Recently active members, for lookups the gateway cache cannot answer in lean mode
+        self.member_cache = MemberCache(MEMBER_CACHE_SIZE, MEMBER_CACHE_TTL, lean=MEMBER_CACHE == 'lean')
+        super().__init__(*args, **kwargs)
+
+    async def invoke(self, ctx):
+        # Timed here so every command is covered, RP commands and failures included
+        start = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            if ctx.command is not None:
+                command_latency.observe(time.perf_counter() - start, command=ctx.command.qualified_name)
+
+    def add_command(self, command):
+        super().add_command(command)
+        self.command_version += 1
+
+    def remove_command(self, name):
+        command = super().remove_command(name)
+        if command is not None:
+            self.command_version += 1
+        return command
+
+    async def setup_hook(self):
+        # One registered handler serves the buttons of every menu message
+        self.add_dynamic_items(MenuButton)
+        level_shards.start()
+        if cluster_stats is not None:
+            cluster_stats.start()
+        if stall_watchdog is not None:
+            stall_watchdog.start()
+        if METRICS_PORT:
+            port = METRICS_PORT + (CLUSTER_ID or 0)
+            try:
+                self.metrics_server = await serve_metrics(metrics, '127.0.0.1', port)
+                print(f'📈 Metrics on http://127.0.0.1:{port}/metrics')
+            except OSError as e:
+                print(f'⚠️ Metrics endpoint not started: {e}')
+        voice_tracker.start()
+        if os.path.exists(LEVELS_XP_MARKER) and not has_global_levels(LEVELS_FILE, LEVELS_DB):
+            level_shards.ready.set()
+
+    async def close(self):
+        # Settle voice time, then flush so nothing is lost on shutdown
+        await voice_tracker.close()
+        await level_shards.close()
+        await announcer.close()
+        if cluster_stats is not None:
+            cluster_stats.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if stall_watchdog is not None:
+            stall_watchdog.close()
+        await super().close()
+
+bot = LevelBot(
+    command_prefix=COMMAND_PREFIX, intents=intents, help_command=None,  # Отключаем встроенную команду help
+    shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **member_cache_settings(MEMBER_CACHE)
+)
+
+def cluster_snapshot():
+    """This process's counters for the cluster-wide totals"""
+    shard_stats = level_shards.stats()
+    return {
+        "shards": len(bot.shards),
+        "guilds": len(bot.guilds),
+        "members": sum(guild.member_count or 0 for guild in bot.guilds),
+        "loaded_guilds": shard_stats["shards"],
+        "loaded_users": shard_stats["users"],
+        "voice_sessions": len(voice_tracker.sessions),
+        "latency_ms": round(bot.latency * 1000),
     }
-}
 
-# Flatten for easy access
-rp_actions = {}
-for category, data in rp_categories.items():
-    for cmd_name, cmd_data in data["commands"].items():
-        rp_actions[cmd_name] = {
-            "text": cmd_data["text"],
-            "color": data["color"],
-            "gifs": cmd_data["gifs"],
-            "category": category,
-            "category_name": data["name"]
-        }
+# Only cluster workers publish stats; a single process already sees everything
+cluster_stats = None
+if CLUSTER_ID is not None:
+    cluster_stats = ClusterStats(CLUSTER_DB, CLUSTER_ID, SHARD_IDS, cluster_snapshot, CLUSTER_STATS_INTERVAL)
+
+# Leaderboard name lookups: gateway cache, then TTL cache, then REST
+LEADERBOARD_SIZE = 10
+name_resolver = NameResolver(bot)
+
+# Level-up messages go through a per-channel queue so the XP path never waits on a send
+announcer = AnnouncementQueue(LEVELUP_ANNOUNCE_WINDOW)
+
+# Anti-spam tracking: one XP-earning message per user per guild every 30 seconds
+MESSAGE_XP_COOLDOWN = 30
+message_cooldowns = CooldownStore(MESSAGE_XP_COOLDOWN, maxsize=200_000)
+
+# XP per message, drawn uniformly from MIN..MAX
+MESSAGE_XP_MIN = 10
+MESSAGE_XP_MAX = 20
+
+# Sizes of the in-memory state, read at scrape time
+metrics.gauge('bot_guilds', 'Guilds this process serves', lambda: len(bot.guilds))
+metrics.gauge('bot_gateway_latency_seconds', 'Average heartbeat latency of the shards', lambda: bot.latency)
+metrics.gauge('bot_members_cached', 'Members held by the gateway cache', lambda: sum(len(guild.members) for guild in bot.guilds))
+metrics.gauge('bot_member_lru_size', 'Recently active members kept by the lean member cache', lambda: len(bot.member_cache.cache))
+metrics.gauge('bot_startup_seconds', 'Seconds from process start to the first on_ready', lambda: bot.startup_seconds or 0)
+metrics.gauge('bot_level_guilds_loaded', 'Guild level stores in memory', lambda: len(level_shards.shards))
+metrics.gauge('bot_level_users_loaded', 'Level records in memory', lambda: sum(len(store.data) for store in level_shards.shards.values()))
+metrics.gauge('bot_level_rows_pending', 'Level changes not written yet', lambda: sum(store.stats()["pending"] for store in level_shards.shards.values()))
+metrics.gauge('bot_message_cooldowns', 'Message XP cooldown entries', lambda: len(message_cooldowns))
+metrics.gauge('bot_voice_sessions', 'Tracked voice sessions', lambda: len(voice_tracker.sessions))
+metrics.gauge('bot_name_cache_entries', 'Cached leaderboard names', lambda: len(name_resolver.cache))
+metrics.gauge('bot_announcement_channels', 'Channels with level-ups waiting to be sent', lambda: announcer.stats()["channels"])
+metrics.gauge('bot_persistent_views', 'Views kept by discord.py (menus are stateless, so normally 0)', lambda: len(bot.persistent_views))
+metrics.gauge('bot_asyncio_tasks', 'Live asyncio tasks', lambda: len(asyncio.all_tasks()))
+
+def command_cooldown(seconds, maxsize=10_000):
+    """Per-user command cooldown backed by a CooldownStore"""
+    store = CooldownStore(seconds, maxsize)
+    cooldown = commands.Cooldown(1, seconds)
+    
+    async def predicate(ctx):
+        if not store.try_acquire(ctx.author.id):
+            raise commands.CommandOnCooldown(cooldown, store.remaining(ctx.author.id), commands.BucketType.user)
+        return True
+    
+    return commands.check(predicate)
+
+# --- RP ACTION CATALOG ---
+
+# Replaced as a whole by !rpreload; the version also keys the cached menu pages
+rp_catalog = load_catalog(RP_CATALOG_FILE)
 
 # --- PAGINATED MENUS ---
+#
+# Menus are stateless: every button is a MenuButton whose custom_id carries
+# the route and page it leads to. The MenuButton class is registered once in
+# setup_hook and handles clicks on every menu message, including ones sent
+# before a restart. Views are built per response with timeout=None and are
+# not kept by the library afterwards.
+
+class MenuButton(discord.ui.DynamicItem[discord.ui.Button], template=r'menu:(?P<route>[a-z]+)(?::(?P<args>[a-z0-9_:]*))?'):
+    """Any menu button; its custom_id is menu:<route>[:<args>]"""
+    def __init__(self, button: discord.ui.Button):
+        super().__init__(button)
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(item)
+    
+    async def callback(self, interaction: discord.Interaction):
+        match = self.template.match(self.custom_id)
+        route = match["route"]
+        args = match["args"].split(":") if match["args"] else []
+        
+        if route == "close":
+            await interaction.response.edit_message(content="Menu closed.", embed=None, view=None)
+            return
+        
+        embed, view = MENU_ROUTES[route](*args)
+        await interaction.response.edit_message(embed=embed, view=view)
+
+def menu_button(label, custom_id, style=discord.ButtonStyle.secondary, emoji=None, row=None, disabled=False):
+    """Create a routed menu button"""
+    return MenuButton(discord.ui.Button(label=label, custom_id=custom_id, style=style, emoji=emoji, row=row, disabled=disabled))
+
+def close_button(row=None, emoji=None):
+    return menu_button("✖️ Close", "menu:close", discord.ButtonStyle.danger, emoji=emoji, row=row)
 
 class PaginatedView(discord.ui.View):
-    """Base class for paginated views"""
-    def __init__(self, embeds, timeout=180):
-        super().__init__(timeout=timeout)
-        self.embeds = embeds
-        self.current_page = 0
-        self.total_pages = len(embeds)
+    """Navigation for one page of a catalog menu"""
+    def __init__(self, menu: str, arg: str, page: int):
+        super().__init__(timeout=None)
+        args = (arg,) if arg else ()
+        total_pages = embed_catalog.page_count(menu, *args)
+        self.current_page = max(0, min(page, total_pages - 1))
+        self.total_pages = total_pages
         
-        # Update button states
-        self.update_buttons()
-    
-    def update_buttons(self):
-        """Update the state of navigation buttons"""
-        self.first_page.disabled = self.current_page == 0
-        self.prev_page.disabled = self.current_page == 0
-        self.next_page.disabled = self.current_page == self.total_pages - 1
-        self.last_page.disabled = self.current_page == self.total_pages - 1
+        def page_button(slot, label, target, style):
+            return menu_button(
+                label, f"menu:page:{slot}:{menu}:{arg}:{target}", style,
+                disabled=target == self.current_page or not 0 <= target < total_pages
+            )
         
-        # Update page counter
-        self.page_counter.label = f"📄 {self.current_page + 1}/{self.total_pages}"
-    
-    @discord.ui.button(label="⏪ First", style=discord.ButtonStyle.secondary)
-    async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.current_page = 0
-        self.update_buttons()
-        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
-    
-    @discord.ui.button(label="◀️ Previous", style=discord.ButtonStyle.primary)
-    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.current_page -= 1
-        self.update_buttons()
-        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
-    
-    @discord.ui.button(label="📄 1/1", style=discord.ButtonStyle.secondary, disabled=True)
-    async def page_counter(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """Just a page counter, no action"""
-        pass
-    
-    @discord.ui.button(label="▶️ Next", style=discord.ButtonStyle.primary)
-    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.current_page += 1
-        self.update_buttons()
-        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
-    
-    @discord.ui.button(label="⏩ Last", style=discord.ButtonStyle.secondary)
-    async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.current_page = self.total_pages - 1
-        self.update_buttons()
-        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
+        self.add_item(page_button("first", "⏪ First", 0, discord.ButtonStyle.secondary))
+        self.add_item(page_button("prev", "◀️ Previous", self.current_page - 1, discord.ButtonStyle.primary))
+        # Just a page counter, no action
+        self.add_item(menu_button(f"📄 {self.current_page + 1}/{total_pages}", "menu:noop", disabled=True))
+        self.add_item(page_button("next", "▶️ Next", self.current_page + 1, discord.ButtonStyle.primary))
+        self.add_item(page_button("last", "⏩ Last", total_pages - 1, discord.ButtonStyle.secondary))
+        
+        if menu == "category":
+            self.add_item(menu_button("◀️ Back to Categories", "menu:rp"))
+        else:
+            self.add_item(menu_button("◀️ Back to Main", "menu:main"))
+        self.add_item(close_button())
 
 class CategoryRPView(discord.ui.View):
     """View for selecting RP command categories"""
     def __init__(self):
-        super().__init__(timeout=180)
-    
-    @discord.ui.button(label="💕 Affection", style=discord.ButtonStyle.primary, emoji="💕", row=0)
-    async def affection_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_category_pages("affection")
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("categories"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="🎉 Playful", style=discord.ButtonStyle.success, emoji="🎉", row=0)
-    async def playful_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_category_pages("playful")
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("categories"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="😈 Mischief", style=discord.ButtonStyle.danger, emoji="😈", row=1)
-    async def mischief_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_category_pages("mischief")
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("categories"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="💝 Caring", style=discord.ButtonStyle.success, emoji="💝", row=1)
-    async def caring_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_category_pages("caring")
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("categories"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="😊 Reactions", style=discord.ButtonStyle.secondary, emoji="😊", row=2)
-    async def reactions_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_category_pages("reactions")
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("categories"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="◀️ Back to Main", style=discord.ButtonStyle.secondary, row=3)
-    async def back_to_main(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = discord.Embed(
-            title="🌟 Main Menu", 
-            description="Select a category:", 
-            color=0x9b59b6
-        )
-        await interaction.response.edit_message(embed=embed, view=MainMenu())
-    
-    @discord.ui.button(label="✖️ Close", style=discord.ButtonStyle.danger, row=3)
-    async def close_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.edit_message(content="Menu closed.", embed=None, view=None)
-    
-    def create_back_button(self, target):
-        button = discord.ui.Button(label="◀️ Back to Categories", style=discord.ButtonStyle.secondary)
-        
-        async def back_callback(interaction: discord.Interaction):
-            embed = create_categories_embed()
-            await interaction.response.edit_message(embed=embed, view=CategoryRPView())
-        
-        button.callback = back_callback
-        return button
-    
-    def create_close_button(self):
-        button = discord.ui.Button(label="✖️ Close", style=discord.ButtonStyle.danger)
-        
-        async def close_callback(interaction: discord.Interaction):
-            await interaction.response.edit_message(content="Menu closed.", embed=None, view=None)
-        
-        button.callback = close_callback
-        return button
+        super().__init__(timeout=None)
+        categories = rp_catalog.categories
+        for index, (cat_id, cat_data) in enumerate(categories.items()):
+            self.add_item(menu_button(
+                cat_data["name"], f"menu:cat:{cat_id}", getattr(discord.ButtonStyle, cat_data["style"]),
+                emoji=cat_data["emoji"], row=index // 2
+            ))
+        back_row = (len(categories) + 1) // 2
+        self.add_item(menu_button("◀️ Back to Main", "menu:main", row=back_row))
+        self.add_item(close_button(row=back_row))
 
 class MainMenu(discord.ui.View):
     """Main menu with category buttons"""
     def __init__(self):
-        super().__init__(timeout=180)
-    
-    @discord.ui.button(label="🎭 RP Commands", style=discord.ButtonStyle.primary, emoji="🎮", row=0)
-    async def rp_menu_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = create_categories_embed()
-        await interaction.response.edit_message(embed=embed, view=CategoryRPView())
-    
-    @discord.ui.button(label="⭐ Level System", style=discord.ButtonStyle.success, emoji="📊", row=0)
-    async def level_menu_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_level_pages()
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("main"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="🔧 Utilities", style=discord.ButtonStyle.secondary, emoji="🛠️", row=0)
-    async def utils_menu_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embeds = create_utils_pages()
-        view = PaginatedView(embeds)
-        view.add_item(self.create_back_button("main"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embeds[0], view=view)
-    
-    @discord.ui.button(label="ℹ️ About", style=discord.ButtonStyle.secondary, emoji="🤖", row=1)
-    async def about_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = create_about_embed()
-        view = discord.ui.View(timeout=180)
-        view.add_item(self.create_back_button("main"))
-        view.add_item(self.create_close_button())
-        await interaction.response.edit_message(embed=embed, view=view)
-    
-    @discord.ui.button(label="✖️ Close", style=discord.ButtonStyle.danger, emoji="❌", row=1)
-    async def close_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.edit_message(content="Menu closed.", embed=None, view=None)
-    
-    def create_back_button(self, target):
-        button = discord.ui.Button(label="◀️ Back to Main", style=discord.ButtonStyle.secondary)
-        
-        async def back_callback(interaction: discord.Interaction):
-            embed = discord.Embed(
-                title="🌟 Main Menu", 
-                description="Select a category:", 
-                color=0x9b59b6
-            )
-            await interaction.response.edit_message(embed=embed, view=MainMenu())
-        
-        button.callback = back_callback
-        return button
-    
-    def create_close_button(self):
-        button = discord.ui.Button(label="✖️ Close", style=discord.ButtonStyle.danger)
-        
-        async def close_callback(interaction: discord.Interaction):
-            await interaction.response.edit_message(content="Menu closed.", embed=None, view=None)
-        
-        button.callback = close_callback
-        return button
+        super().__init__(timeout=None)
+        self.add_item(menu_button("🎭 RP Commands", "menu:rp", discord.ButtonStyle.primary, emoji="🎮", row=0))
+        self.add_item(menu_button("⭐ Level System", "menu:page:open:level::0", discord.ButtonStyle.success, emoji="📊", row=0))
+        self.add_item(menu_button("🔧 Utilities", "menu:page:open:utils::0", discord.ButtonStyle.secondary, emoji="🛠️", row=0))
+        self.add_item(menu_button("ℹ️ About", "menu:about", discord.ButtonStyle.secondary, emoji="🤖", row=1))
+        self.add_item(close_button(row=1, emoji="❌"))
+
+class AboutView(discord.ui.View):
+    """Back and close buttons under the about page"""
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(menu_button("◀️ Back to Main", "menu:main"))
+        self.add_item(close_button())
+
+def show_page(slot, menu, arg, page):
+    if menu == "category" and arg not in rp_catalog.categories:
+        # The category was removed by a catalog reload
+        return embed_catalog.embed("categories"), CategoryRPView()
+    view = PaginatedView(menu, arg, int(page))
+    args = (arg,) if arg else ()
+    return embed_catalog.page(menu, view.current_page, *args), view
+
+# Where each menu route leads: route -> (*args) -> (embed, view)
+MENU_ROUTES = {
+    "main": lambda: (embed_catalog.embed("main"), MainMenu()),
+    "rp": lambda: (embed_catalog.embed("categories"), CategoryRPView()),
+    "cat": lambda category_id: show_page("open", "category", category_id, 0),
+    "page": show_page,
+    "about": lambda: (embed_catalog.embed("about"), AboutView()),
+}
 
 # --- PAGE CREATION FUNCTIONS ---
 
@@ -411,19 +432,19 @@ def create_categories_embed():
         color=0xff69b4
     )
     
-    for cat_id, cat_data in rp_categories.items():
+    for cat_id, cat_data in rp_catalog.categories.items():
         embed.add_field(
             name=f"{cat_data['name']}",
             value=f"{cat_data['description']}\n*{len(cat_data['commands'])} commands*",
             inline=True
         )
     
-    embed.set_footer(text=f"Total RP Commands: {len(rp_actions)} • Click a category below")
+    embed.set_footer(text=f"Total RP Commands: {len(rp_catalog.actions)} • Click a category below")
     return embed
 
 def create_category_pages(category_id: str) -> List[discord.Embed]:
     """Create paginated pages for a specific category"""
-    category = rp_categories[category_id]
+    category = rp_catalog.categories[category_id]
     pages = []
     commands_per_page = 4
     
@@ -440,8 +461,8 @@ def create_category_pages(category_id: str) -> List[discord.Embed]:
             color=category["color"]
         )
         
-        for cmd_name, cmd_data in commands_list[start_idx:end_idx]:
-            example = cmd_data["text"].format(author="You", target="@user")
+        for cmd_name, action in commands_list[start_idx:end_idx]:
+            example = action.render("You", "@user")
             embed.add_field(
                 name=f"!{cmd_name} @user",
                 value=example,
@@ -545,28 +566,32 @@ def create_about_embed():
     )
     embed.add_field(name="Version", value="3.0.0", inline=True)
     embed.add_field(name="Creator", value="iimbulchka", inline=True)
-    embed.add_field(name="Commands", value=f"{len(bot.commands) + len(rp_actions)}+", inline=True)
-    embed.add_field(name="RP Commands", value=f"**{len(rp_actions)}** in 5 categories", inline=True)
+    embed.add_field(name="Commands", value=f"{len(bot.commands) + len(rp_catalog.actions)}+", inline=True)
+    embed.add_field(name="RP Commands", value=f"**{len(rp_catalog.actions)}** in {len(rp_catalog.categories)} categories", inline=True)
     embed.add_field(name="Features", value="• Level System\n• RP Commands by Category\n• Paginated Menus\n• Voice XP\n• Utilities", inline=False)
     embed.set_footer(text="Thanks for using this bot!")
     return embed
 
-# --- COMMANDS ---
-
-@bot.command(name='menu')
-async def show_menu(ctx):
-    """Show the main interactive menu"""
+def create_menu_embed():
+    """Create the embed sent by !menu"""
     embed = discord.Embed(
         title="🌟 Main Menu", 
         description="Select a category using the buttons below:", 
         color=0x9b59b6
     )
     embed.set_footer(text="Click a button to see more options")
-    await ctx.send(embed=embed, view=MainMenu())
+    return embed
 
-@bot.command(name='commands', aliases=['cmds'])  # Убрал 'help' из алиасов
-async def list_commands(ctx):
-    """Show all available commands"""
+def create_main_embed():
+    """Create the embed shown when going back to the main menu"""
+    return discord.Embed(
+        title="🌟 Main Menu", 
+        description="Select a category:", 
+        color=0x9b59b6
+    )
+
+def create_commands_embed():
+    """Create the !commands overview"""
     embed = discord.Embed(title="📋 All Commands", color=0x3498db)
     
     embed.add_field(
@@ -577,8 +602,8 @@ async def list_commands(ctx):
     
     # Group RP commands by category
     rp_by_category = {}
-    for cmd_name, cmd_data in rp_actions.items():
-        cat_name = cmd_data["category_name"]
+    for cmd_name, action in rp_catalog.actions.items():
+        cat_name = action.category_name
         if cat_name not in rp_by_category:
             rp_by_category[cat_name] = []
         rp_by_category[cat_name].append(f"`!{cmd_name}`")
@@ -602,8 +627,85 @@ async def list_commands(ctx):
         inline=False
     )
     
-    embed.set_footer(text=f"Total commands: {len(bot.commands) + len(rp_actions)}")
-    await ctx.send(embed=embed)
+    embed.set_footer(text=f"Total commands: {len(bot.commands) + len(rp_catalog.actions)}")
+    return embed
+
+# --- EMBED CATALOG ---
+
+class EmbedCatalog:
+    """Menu embeds built on first use and kept as embed dicts
+
+    Menu content only depends on the RP catalog and the command set, so
+    pages are rebuilt only when version() changes. Each page is stored as
+    its to_dict() output and handlers get a fresh Embed built from a deep
+    copy of it, so editing one never changes the cached page.
+    """
+    def __init__(self, builders, version):
+        self.builders = builders
+        self.version = version
+        self._pages: Dict[tuple, List[dict]] = {}
+        self._built_for = None
+        self.builds = 0
+
+    def invalidate(self):
+        self._pages.clear()
+        self._built_for = None
+
+    def _cached(self, name: str, *args) -> List[dict]:
+        version = self.version()
+        if version != self._built_for:
+            self.invalidate()
+            self._built_for = version
+
+        key = (name, *args)
+        pages = self._pages.get(key)
+        if pages is None:
+            built = self.builders[name](*args)
+            if isinstance(built, discord.Embed):
+                built = [built]
+            pages = self._pages[key] = [embed.to_dict() for embed in built]
+            self.builds += 1
+        return pages
+
+    def embed(self, name: str, *args) -> discord.Embed:
+        """Fresh copy of a single-page menu"""
+        return self.page(name, 0, *args)
+
+    def page(self, name: str, index: int, *args) -> discord.Embed:
+        """Fresh copy of one page of a menu"""
+        return discord.Embed.from_dict(copy.deepcopy(self._cached(name, *args)[index]))
+
+    def page_count(self, name: str, *args) -> int:
+        return len(self._cached(name, *args))
+
+embed_catalog = EmbedCatalog(
+    {
+        "menu": create_menu_embed,
+        "main": create_main_embed,
+        "categories": create_categories_embed,
+        "category": create_category_pages,
+        "level": create_level_pages,
+        "utils": create_utils_pages,
+        "about": create_about_embed,
+        "commands": create_commands_embed,
+    },
+    # Rebuild when commands are added/removed or the RP catalog changes
+    version=lambda: (bot.command_version, rp_catalog.version)
+)
+metrics.gauge('bot_menu_embed_builds', 'Menu embeds built since start (a rise means the cache was invalidated)',
+              lambda: embed_catalog.builds)
+
+# --- COMMANDS ---
+
+@bot.command(name='menu')
+async def show_menu(ctx):
+    """Show the main interactive menu"""
+    await ctx.send(embed=embed_catalog.embed("menu"), view=MainMenu())
+
+@bot.command(name='commands', aliases=['cmds'])  # Убрал 'help' из алиасов
+async def list_commands(ctx):
+    """Show all available commands"""
+    await ctx.send(embed=embed_catalog.embed("commands"))
 
 @bot.command(name='ping')
 async def ping(ctx):
@@ -636,7 +738,7 @@ async def server_info(ctx):
         embed.set_thumbnail(url=guild.icon.url)
     
     embed.add_field(name="🆔 Server ID", value=guild.id, inline=True)
-    embed.add_field(name="👑 Owner", value=guild.owner.mention, inline=True)
+    embed.add_field(name="👑 Owner", value=f"<@{guild.owner_id}>", inline=True)
     embed.add_field(name="📅 Created", value=guild.created_at.strftime("%d.%m.%Y"), inline=True)
     embed.add_field(name="👥 Members", value=guild.member_count, inline=True)
     embed.add_field(name="💬 Channels", value=len(guild.channels), inline=True)
@@ -647,7 +749,7 @@ async def server_info(ctx):
     await ctx.send(embed=embed)
 
 @bot.command(name='user', aliases=['userinfo', 'whois'])
-async def user_info(ctx, member: discord.Member = None):
+async def user_info(ctx, member: MemberLookup = None):
     """Show user information"""
     if member is None:
         member = ctx.author
@@ -668,7 +770,7 @@ async def user_info(ctx, member: discord.Member = None):
     await ctx.send(embed=embed)
 
 @bot.command(name='avatar', aliases=['av', 'pfp'])
-async def avatar(ctx, member: discord.Member = None):
+async def avatar(ctx, member: MemberLookup = None):
     """Show user avatar"""
     if member is None:
         member = ctx.author
@@ -769,19 +871,16 @@ async def magic_8ball(ctx, *, question):
 # --- PROFILE AND LEVEL COMMANDS ---
 
 @bot.command(name='profile', aliases=['p'])
-async def profile(ctx, member: discord.Member = None):
+@commands.guild_only()
+async def profile(ctx, member: MemberLookup = None):
     """Show user profile with level info"""
     if member is None:
         member = ctx.author
     
+    store = await level_shards.acquire(ctx.guild.id)
     user_id = str(member.id)
-    if user_id not in user_levels:
-        user_levels[user_id] = {"xp": 0, "level": 1, "messages": 0, "voice_time": 0}
-    
-    data = user_levels[user_id]
-    current_level = data["level"]
-    current_xp = data["xp"]
-    xp_for_next = 100 * (current_level ** 2)
+    data = store.get(user_id)
+    current_level, current_xp, xp_for_next = level_progress(data["xp"])
     progress = (current_xp / xp_for_next) * 100 if xp_for_next > 0 else 0
     
     # Create progress bar
@@ -794,36 +893,38 @@ async def profile(ctx, member: discord.Member = None):
     embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
     embed.add_field(name="Level", value=f"**{current_level}**", inline=True)
     embed.add_field(name="Experience", value=f"{current_xp}/{xp_for_next}", inline=True)
+    embed.add_field(name="Total XP", value=data["xp"], inline=True)
     embed.add_field(name="Progress", value=f"{progress_bar} {progress:.1f}%", inline=False)
     embed.add_field(name="Messages", value=data["messages"], inline=True)
     embed.add_field(name="Voice Time", value=f"{data['voice_time']} min", inline=True)
-    embed.add_field(name="Rank", value=f"#{await get_rank(user_id)}", inline=True)
+    embed.add_field(name="Rank", value=f"#{await get_rank(store, user_id)}", inline=True)
     
     await ctx.send(embed=embed)
 
 @bot.command(name='level', aliases=['lvl'])
+@commands.guild_only()
 async def level(ctx):
     """Show your current level"""
     await profile(ctx, ctx.author)
 
 @bot.command(name='top', aliases=['leaderboard', 'lb'])
+@commands.guild_only()
+@command_cooldown(5)
 async def top(ctx):
     """Show level leaderboard"""
     # Sort users by level and XP
-    sorted_users = sorted(user_levels.items(), key=lambda x: (x[1]["level"], x[1]["xp"]), reverse=True)[:10]
+    store = await level_shards.acquire(ctx.guild.id)
+    sorted_users = await store.top(LEADERBOARD_SIZE)
+    names = await name_resolver.resolve_many((user_id for user_id, _ in sorted_users), ctx.guild)
     
     embed = discord.Embed(
-        title="🏆 Leaderboard",
+        title=f"🏆 Leaderboard: {ctx.guild.name}",
         description="**Top 10 Users by Level:**",
         color=0xffd700
     )
     
     for i, (user_id, data) in enumerate(sorted_users, 1):
-        try:
-            user = await bot.fetch_user(int(user_id))
-            name = user.name
-        except:
-            name = f"Unknown User"
+        name = names[int(user_id)]
         
         medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "📌"
         embed.add_field(
@@ -834,13 +935,208 @@ async def top(ctx):
     
     await ctx.send(embed=embed)
 
-async def get_rank(user_id):
-    """Get user rank"""
-    sorted_users = sorted(user_levels.items(), key=lambda x: (x[1]["level"], x[1]["xp"]), reverse=True)
-    for i, (uid, _) in enumerate(sorted_users, 1):
-        if uid == user_id:
-            return i
-    return len(sorted_users) + 1
+async def get_rank(store, user_id):
+    """Get user rank within a guild"""
+    return await store.rank(user_id)
+
+@bot.command(name='storage')
+@commands.is_owner()
+async def storage_stats(ctx):
+    """Show level data persistence counters"""
+    stats = level_shards.stats()
+
+    embed = discord.Embed(title="💾 Level Storage", description=f"Backend: **{LEVELS_BACKEND}**", color=0x3498db)
+    embed.add_field(name="Loaded Guilds", value=stats["shards"], inline=True)
+    embed.add_field(name="Loaded Users", value=stats["users"], inline=True)
+    embed.add_field(name="Loads / Unloads", value=f"{stats['loads']} / {stats['unloads']}", inline=True)
+    embed.add_field(name="Changes", value=stats.get("mutations", 0), inline=True)
+    embed.add_field(name="Flushes", value=stats.get("flushes", 0), inline=True)
+    embed.add_field(name="Pending", value=stats.get("pending", 0), inline=True)
+    embed.add_field(name="Bytes Written", value=f"{stats.get('bytes_written', 0):,}", inline=True)
+    embed.add_field(name="Compactions", value=stats.get("compactions", 0), inline=True)
+    embed.add_field(name="Uncompacted", value=f"{stats.get('journal_bytes', 0):,} bytes", inline=True)
+    embed.set_footer(text=f"Flush every {LEVELS_FLUSH_INTERVAL:g}s or {LEVELS_FLUSH_THRESHOLD} changes • Counters of loaded guilds")
+
+    await ctx.send(embed=embed)
+
+@bot.command(name='namecache')
+@commands.is_owner()
+async def name_cache_stats(ctx):
+    """Show leaderboard name cache counters"""
+    stats = name_resolver.stats()
+
+    embed = discord.Embed(title="🗂️ Name Cache", color=0x3498db)
+    embed.add_field(name="Gateway Hits", value=stats["gateway_hits"], inline=True)
+    embed.add_field(name="Cache Hits", value=stats["cache_hits"], inline=True)
+    embed.add_field(name="Cache Misses", value=stats["cache_misses"], inline=True)
+    embed.add_field(name="REST Fetches", value=stats["fetches"], inline=True)
+    embed.add_field(name="Failed Fetches", value=stats["failures"], inline=True)
+    embed.add_field(name="Cached Names", value=stats["cache_size"], inline=True)
+
+    await ctx.send(embed=embed)
+
+@bot.command(name='cluster')
+@commands.is_owner()
+async def cluster_info(ctx):
+    """Show every cluster process and the cluster-wide totals"""
+    if cluster_stats is None:
+        await ctx.send(f"ℹ️ Not running as a cluster: one process with {len(bot.shards)} shard(s) and {len(bot.guilds)} servers.")
+        return
+    
+    await cluster_stats.publish()
+    processes = await cluster_stats.processes()
+    totals = await cluster_stats.totals()
+    
+    embed = discord.Embed(
+        title="🌐 Cluster",
+        description=f"**{totals['processes']}** processes • **{totals.get('guilds', 0)}** servers • "
+                    f"**{totals.get('loaded_users', 0)}** loaded users",
+        color=0x3498db
+    )
+    for process in processes:
+        shard_ids = process["shard_ids"] or [0]
+        status = "🟢" if process["alive"] else f"🔴 silent for {process['age']:.0f}s"
+        embed.add_field(
+            name=f"Cluster {process['cluster_id']} (shards {shard_ids[0]}-{shard_ids[-1]})",
+            value=f"{status}\n{process.get('guilds', 0)} servers • {process.get('latency_ms', 0)}ms\n"
+                  f"{process.get('voice_sessions', 0)} in voice",
+            inline=True
+        )
+    embed.set_footer(text=f"This is cluster {CLUSTER_ID}")
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='stats')
+@commands.is_owner()
+async def bot_stats(ctx):
+    """Show command latency, XP throughput and memory usage counters"""
+    uptime = datetime.timedelta(seconds=int(time.time() - metrics.started))
+    startup = f"{bot.startup_seconds:.1f}s" if bot.startup_seconds is not None else "not ready yet"
+    embed = discord.Embed(title="📈 Bot Stats", description=f"Uptime: **{uptime}** • Startup: **{startup}**", color=0x3498db)
+    
+    embed.add_field(name="Messages", value=f"{messages_seen.total():,.0f}", inline=True)
+    embed.add_field(
+        name="XP Grants",
+        value="\n".join(f"{key[0]}: {count:,.0f}" for key, count in sorted(xp_grants.values.items())) or "none",
+        inline=True
+    )
+    embed.add_field(name="Level-ups", value=f"{level_ups.total():,.0f}", inline=True)
+    
+    # Busiest commands with bucketed p50/p95 latency
+    busiest = sorted(command_latency.series, key=command_latency.count, reverse=True)[:8]
+    lines = [
+        f"`!{key[0]}` ×{command_latency.count(key)} • p50 ≤{command_latency.quantile(0.5, key) * 1000:g}ms "
+        f"• p95 ≤{command_latency.quantile(0.95, key) * 1000:g}ms"
+        for key in busiest
+    ]
+    embed.add_field(name="Command Latency", value="\n".join(lines) or "No commands yet", inline=False)
+    
+    io_lines = []
+    for operation in ("load", "flush", "compact"):
+        if store_io.count((operation,)):
+            io_lines.append(
+                f"{operation}: ×{store_io.count((operation,))} • p95 ≤{store_io.quantile(0.95, (operation,)) * 1000:g}ms"
+            )
+    embed.add_field(name="Level Store I/O", value="\n".join(io_lines) or "No writes yet", inline=False)
+    
+    stage_lines = []
+    for stage in INGEST_STAGES:
+        count = ingest_messages.values.get((stage,), 0)
+        if count:
+            stage_lines.append(f"{stage}: ×{count:,.0f} • {ingest_seconds.values[(stage,)] / count * 1e6:,.1f}µs avg")
+    embed.add_field(name="Message Ingestion", value="\n".join(stage_lines) or "No messages yet", inline=False)
+    
+    embed.add_field(name="Loaded Users", value=sum(len(store.data) for store in level_shards.shards.values()), inline=True)
+    embed.add_field(name="Cooldown Entries", value=len(message_cooldowns), inline=True)
+    member_stats = bot.member_cache.stats()
+    embed.add_field(
+        name=f"Members ({MEMBER_CACHE})",
+        value=f"{sum(len(guild.members) for guild in bot.guilds):,} cached • {member_stats['size']:,} recent • "
+              f"{member_stats['fetches']} fetched",
+        inline=True
+    )
+    embed.add_field(name="Voice Sessions", value=len(voice_tracker.sessions), inline=True)
+    embed.add_field(name="Asyncio Tasks", value=len(asyncio.all_tasks()), inline=True)
+    embed.add_field(name="Gateway Latency", value=f"{bot.latency * 1000:.0f}ms", inline=True)
+    if METRICS_PORT:
+        embed.set_footer(text=f"Prometheus: http://127.0.0.1:{METRICS_PORT + (CLUSTER_ID or 0)}/metrics")
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='stalls')
+@commands.is_owner()
+async def stall_report(ctx):
+    """Show the code that blocked the event loop the longest"""
+    if stall_watchdog is None:
+        await ctx.send("ℹ️ The stall watchdog is off. Set `STALL_THRESHOLD_MS` (e.g. 50) and restart to enable it.")
+        return
+    
+    embed = discord.Embed(
+        title="🐢 Event Loop Stalls",
+        description=f"**{stall_watchdog.stalls}** stalls over {STALL_THRESHOLD_MS:g}ms • "
+                    f"worst lag {stall_watchdog.max_lag * 1000:.0f}ms",
+        color=0xe67e22
+    )
+    for location, count, total, worst, stack in stall_watchdog.worst(5):
+        embed.add_field(
+            name=f"{location}"[:256],
+            value=f"×{count} • total {total * 1000:.0f}ms • worst {worst * 1000:.0f}ms",
+            inline=False
+        )
+    if not stall_watchdog.offenders:
+        embed.add_field(name="No stalls", value="Nothing has blocked the loop yet.", inline=False)
+    embed.set_footer(text="Full stacks of the worst stalls are in the console log")
+    
+    await ctx.send(embed=embed)
+
+# --- BULK LEVEL ADMINISTRATION ---
+
+# Guilds with a bulk operation in progress
+bulk_running = set()
+
+@bot.command(name='xpadmin')
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def xp_admin(ctx, operation: str, value: str = None, confirm: str = None):
+    """Bulk XP changes for the whole server: scale, add, reset, recompute"""
+    usage = (
+        "Usage: `!xpadmin scale <factor>` (`!xpadmin scale 0 confirm` resets) • `!xpadmin add <xp>` • "
+        "`!xpadmin reset confirm` • `!xpadmin recompute`"
+    )
+    try:
+        args = parse_bulk_args(operation, value, confirm)
+    except ValueError:
+        await ctx.send(f"❌ {usage}")
+        return
+    
+    if ctx.guild.id in bulk_running:
+        await ctx.send("⏳ A bulk operation is already running for this server.")
+        return
+    
+    bulk_running.add(ctx.guild.id)
+    try:
+        store = await level_shards.acquire(ctx.guild.id)
+        status = await ctx.send(f"⏳ Running `{operation}` over {len(store.data):,} users...")
+        start = time.perf_counter()
+        last_report = start
+        
+        async def report(saved, total):
+            # Edits are rate limited, so report every few seconds and at the end
+            nonlocal last_report
+            now = time.perf_counter()
+            if saved == total or now - last_report >= 3:
+                last_report = now
+                await status.edit(content=f"⏳ Running `{operation}`: saved {saved:,}/{total:,} changed users")
+        
+        changed = await run_bulk(store, operation, *args, progress=report)
+        await status.edit(
+            content=f"✅ `{operation}` done: {changed:,} of {len(store.data):,} users changed "
+                    f"in {time.perf_counter() - start:.1f}s"
+        )
+    except (RuntimeError, BulkRangeError) as e:
+        await ctx.send(f"❌ {e}")
+    finally:
+        bulk_running.discard(ctx.guild.id)
 
 # --- RP COMMANDS (dynamically created) ---
 
@@ -850,146 +1146,247 @@ async def send_rp_action(ctx, action_key, target):
         await ctx.send("❌ You cannot use this action on yourself!")
         return
     
-    action_data = rp_actions.get(action_key)
-    if not action_data:
+    action = rp_catalog.actions.get(action_key)
+    if not action:
         await ctx.send("❌ Action not found!")
         return
     
-    message = action_data['text'].format(author=ctx.author.mention, target=target.mention)
+    message = action.render(ctx.author.mention, target.mention)
     
-    embed = discord.Embed(description=message, color=action_data['color'])
+    embed = discord.Embed(description=message, color=action.color)
     
     # Add random GIF with 50% chance
-    if action_data['gifs'] and random.random() < 0.5:
-        embed.set_image(url=random.choice(action_data['gifs']))
-    
-    # Add XP for using RP commands
-    user_id = str(ctx.author.id)
-    if user_id in user_levels:
-        user_levels[user_id]["xp"] += 5
-        check_level_up(user_id)
-        save_levels(user_levels)
+    if action.gifs and random.random() < 0.5:
+        embed.set_image(url=random.choice(action.gifs))
     
     await ctx.send(embed=embed)
+    
+    # Add XP for using RP commands (only for users the level system already knows)
+    if ctx.guild:
+        try:
+            store = level_shards.use_loaded(ctx.guild.id)
+            if store is not None:
+                grant_xp(store, [str(ctx.author.id)], 5, "rp", create=False)
+            else:
+                # The reply above never waits for the guild's levels to load
+                run_in_background(grant_rp_xp_after_load(ctx.guild.id, ctx.author.id), name=f"rp-xp-{ctx.guild.id}")
+        except Exception as e:
+            print(f"❌ RP XP failed in guild {ctx.guild.id}: {e}")
+
+async def grant_rp_xp_after_load(guild_id, author_id):
+    """RP XP for a guild whose levels still have to be loaded"""
+    try:
+        store = await level_shards.acquire(guild_id)
+    except ShardUnavailable:
+        # Already reported when the load failed; retried after the back-off
+        return
+    grant_xp(store, [str(author_id)], 5, "rp", create=False)
 
-# Dynamically create RP commands
-for action_name in rp_actions.keys():
-    @bot.command(name=action_name)
-    async def rp_command(ctx, member: discord.Member = None, action=action_name):
+def make_rp_command(action_name):
+    """One command per RP action; the action itself is looked up when it runs"""
+    async def rp_command(ctx, member: MemberLookup = None):
         if member is None:
-            await ctx.send(f"❌ Please mention a user! Example: `!{action} @username`")
+            await ctx.send(f"❌ Please mention a user! Example: `!{action_name} @username`")
             return
-        await send_rp_action(ctx, action, member)
+        await send_rp_action(ctx, action_name, member)
+    
+    return commands.Command(rp_command, name=action_name, extras={"rp": True})
 
-# --- LEVEL SYSTEM ---
+def sync_rp_commands(catalog):
+    """Register the catalog's actions as commands and drop the ones it no longer has
+    
+    Raises CatalogError before changing anything if an action would shadow a regular command.
+    """
+    for name in catalog.actions:
+        existing = bot.all_commands.get(name)
+        if existing is not None and not existing.extras.get("rp"):
+            raise CatalogError(f"!{name} is already a bot command")
+    
+    for command in list(bot.commands):
+        if command.extras.get("rp") and command.name not in catalog.actions:
+            bot.remove_command(command.name)
+    for name in catalog.actions:
+        if name not in bot.all_commands:
+            bot.add_command(make_rp_command(name))
 
-def check_level_up(user_id):
-    """Check if user should level up"""
-    if user_id not in user_levels:
-        return False
+sync_rp_commands(rp_catalog)
+
+@bot.command(name='rpreload')
+@commands.is_owner()
+async def reload_rp_catalog(ctx):
+    """Reload the RP catalog file without restarting (owner only)"""
+    global rp_catalog
     
-    data = user_levels[user_id]
-    current_level = data["level"]
-    current_xp = data["xp"]
-    xp_needed = 100 * (current_level ** 2)
+    loop = asyncio.get_running_loop()
+    try:
+        catalog = await loop.run_in_executor(None, load_catalog, RP_CATALOG_FILE, rp_catalog.version + 1)
+        sync_rp_commands(catalog)
+    except (OSError, CatalogError) as e:
+        await ctx.send(f"❌ RP catalog not reloaded: {e}")
+        return
     
-    if current_xp >= xp_needed:
-        data["level"] += 1
-        data["xp"] -= xp_needed
-        return True
-    return False
+    added = catalog.actions.keys() - rp_catalog.actions.keys()
+    removed = rp_catalog.actions.keys() - catalog.actions.keys()
+    # Swapped in one step: handlers see either the old catalog or the new one
+    rp_catalog = catalog
+    
+    await ctx.send(
+        f"✅ RP catalog reloaded: **{len(catalog.actions)}** actions in {len(catalog.categories)} categories "
+        f"(+{len(added)} / -{len(removed)})"
+    )
+
+# --- LEVEL SYSTEM ---
+
+def grant_xp(store, user_ids, amounts, source, create=True):
+    """store.grant_xp plus the XP metrics; source is 'message', 'voice' or 'rp'"""
+    user_ids = [str(user_id) for user_id in user_ids]
+    amounts = [amounts] * len(user_ids) if isinstance(amounts, int) else list(amounts)
+    if not create:
+        # The store skips users without a record, so they are not counted either
+        granted = [(user_id, amount) for user_id, amount in zip(user_ids, amounts) if user_id in store.data]
+        user_ids = [user_id for user_id, _ in granted]
+        amounts = [amount for _, amount in granted]
+    leveled_up = store.grant_xp(user_ids, amounts, create)
+    xp_grants.inc(len(user_ids), source=source)
+    xp_granted.inc(sum(amounts), source=source)
+    level_ups.inc(len(leveled_up), source=source)
+    return leveled_up
+
+# Counter series of the message path, resolved once instead of per message
+_stage_messages = {stage: ingest_messages.series(stage=stage) for stage in INGEST_STAGES}
+_stage_seconds = {stage: ingest_seconds.series(stage=stage) for stage in INGEST_STAGES}
+_message_grants = xp_grants.series(source="message")
+_message_xp = xp_granted.series(source="message")
+_message_level_ups = level_ups.series(source="message")
+
+def _stage_done(stage, started):
+    """Count a message through a stage; returns the time it ended"""
+    now = time.perf_counter()
+    _stage_messages[stage].inc()
+    _stage_seconds[stage].inc(now - started)
+    return now
+
+def award_message_xp(store, channel, author_id, amount):
+    """Count a message and its XP in a loaded store, announcing a level-up"""
+    level = store.record_message(str(author_id), amount)
+    _message_grants.inc()
+    _message_xp.inc(amount)
+    if level:
+        _message_level_ups.inc()
+        announcer.announce(channel, author_id, level)
+
+async def award_message_xp_after_load(guild_id, channel, author_id, amount):
+    """award_message_xp for a guild whose levels still have to be loaded"""
+    try:
+        store = await level_shards.acquire(guild_id)
+    except ShardUnavailable:
+        # Already reported when the load failed; retried after the back-off
+        return
+    award_message_xp(store, channel, author_id, amount)
 
 @bot.event
 async def on_message(message):
     """Process messages for XP system"""
-    if message.author.bot:
+    # Stage 1: drop bots and decide whether the command framework needs to see this at all
+    started = time.perf_counter()
+    author = message.author
+    if author.bot:
         return
-    
-    # XP System
-    user_id = str(message.author.id)
-    current_time = datetime.datetime.now()
-    
-    # Initialize user data
-    if user_id not in user_levels:
-        user_levels[user_id] = {"xp": 0, "level": 1, "messages": 0, "voice_time": 0}
-    
-    # Anti-spam check (30 seconds cooldown)
-    last_time = last_message_time[message.guild.id].get(user_id)
-    if not last_time or (current_time - last_time).total_seconds() > 30:
-        # Give XP: 10-20 per message
-        xp_gain = random.randint(10, 20)
-        user_levels[user_id]["xp"] += xp_gain
-        user_levels[user_id]["messages"] += 1
-        
-        # Check level up
-        if check_level_up(user_id):
-            level = user_levels[user_id]["level"]
-            await message.channel.send(f"🎉 {message.author.mention} reached level **{level}**!")
-        
-        last_message_time[message.guild.id][user_id] = current_time
-        save_levels(user_levels)
-    
-    await bot.process_commands(message)
+    messages_seen.inc()
+    guild = message.guild
+    is_command = message.content.startswith(COMMAND_PREFIX)
+    started = _stage_done("filter", started)
+    
+    # Stage 2: XP (levels are per guild, so DMs earn nothing), once per cooldown window
+    if guild is not None:
+        if message_cooldowns.try_acquire((guild.id, author.id)):
+            # Once per cooldown window is often enough to keep an active member cached
+            bot.member_cache.touch(author)
+            amount = MESSAGE_XP_MIN + int(random.random() * (MESSAGE_XP_MAX - MESSAGE_XP_MIN + 1))
+            try:
+                store = level_shards.use_loaded(guild.id)
+                if store is not None:
+                    award_message_xp(store, message.channel, author.id, amount)
+                else:
+                    # Loading (or migrating) the guild's levels must not hold up its commands
+                    run_in_background(
+                        award_message_xp_after_load(guild.id, message.channel, author.id, amount),
+                        name=f"message-xp-{guild.id}"
+                    )
+            except Exception as e:
+                # Commands still run when levels cannot be updated
+                print(f"❌ Message XP failed in guild {guild.id}: {e}")
+        started = _stage_done("xp", started)
+    
+    # Stage 3: only prefixed messages pay for building a Context and parsing
+    if is_command:
+        await bot.process_commands(message)
+        _stage_done("commands", started)
 
 @bot.event
 async def on_voice_state_update(member, before, after):
     """Track voice activity for XP"""
-    if member.bot:
-        return
-    
-    user_id = str(member.id)
-    
-    # Initialize user data
-    if user_id not in user_levels:
-        user_levels[user_id] = {"xp": 0, "level": 1, "messages": 0, "voice_time": 0}
+    # Bots are tracked too (they count as company) but never earn XP
     
-    # User joined voice channel
+    # User joined or moved to another voice channel
     if after.channel and (not before.channel or before.channel != after.channel):
-        voice_timer = asyncio.create_task(voice_xp_timer(member, after.channel))
-        member.voice_timer = voice_timer
+        voice_tracker.join(member.id, member.guild.id, after.channel.id, earns=not member.bot)
     
     # User left voice channel
-    if before.channel and (not after.channel or before.channel != after.channel):
-        if hasattr(member, 'voice_timer'):
-            member.voice_timer.cancel()
+    elif before.channel and not after.channel:
+        voice_tracker.leave(member.id, member.guild.id)
 
-async def voice_xp_timer(member, channel):
-    """Timer for voice XP"""
-    try:
-        while True:
-            await asyncio.sleep(60)  # Every minute
-            
-            # Check if user is still in voice and not alone
-            if member.voice and member.voice.channel == channel:
-                if len(channel.members) > 1:
-                    user_id = str(member.id)
-                    if user_id not in user_levels:
-                        user_levels[user_id] = {"xp": 0, "level": 1, "messages": 0, "voice_time": 0}
-                    
-                    # Give XP for voice time
-                    user_levels[user_id]["xp"] += 5
-                    user_levels[user_id]["voice_time"] += 1
-                    
-                    # Check level up
-                    if check_level_up(user_id):
-                        if member.guild.system_channel:
-                            await member.guild.system_channel.send(f"🎉 {member.mention} reached level **{user_levels[user_id]['level']}**!")
-                    
-                    save_levels(user_levels)
-            else:
-                break
-    except asyncio.CancelledError:
-        pass
+@bot.event
+async def on_disconnect():
+    # Account voice time up to the disconnect; on_ready reconciles the rest
+    voice_tracker.suspend()
+
+def current_voice_states():
+    """(member_id, guild_id, channel_id, is_bot) for everyone in voice right now"""
+    for guild in bot.guilds:
+        for channel in guild.voice_channels + guild.stage_channels:
+            for member_id in channel.voice_states:
+                member = guild.get_member(member_id)
+                yield member_id, guild.id, channel.id, bool(member and member.bot)
+
+async def grant_voice_xp(guild_id, minutes_by_member):
+    """Convert settled voice minutes into XP for members of one guild"""
+    if bot.get_guild(guild_id) is None:
+        # The guild moved to another cluster process (or the bot left it): its levels are not ours to write
+        return
+    store = await level_shards.acquire(guild_id)
+    user_ids = [str(member_id) for member_id in minutes_by_member]
+    for user_id, minutes in zip(user_ids, minutes_by_member.values()):
+        store.get(user_id)["voice_time"] += minutes
+        # Voice time does not move anyone in the ranking, it only has to be saved
+        store.mark_dirty(user_id, reindex=False)
+    
+    # Give XP for voice time: 5 XP per minute (a long settlement can be worth several levels)
+    leveled_up = grant_xp(store, user_ids, [5 * minutes for minutes in minutes_by_member.values()], "voice")
+    
+    guild = bot.get_guild(guild_id)
+    if guild and guild.system_channel:
+        for user_id, level in leveled_up.items():
+            announcer.announce(guild.system_channel, int(user_id), level)
+
+# Voice time is settled into XP every few minutes; open sessions survive restarts
+voice_tracker = VoiceTracker(grant_voice_xp, VOICE_SESSIONS_FILE, VOICE_SETTLE_INTERVAL)
 
 # --- ERROR HANDLERS ---
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handle command errors"""
+    if ctx.command is not None:
+        command_errors.inc(command=ctx.command.qualified_name)
     if isinstance(error, commands.MissingRequiredArgument):
         await ctx.send("❌ Missing required argument. Use `!commands` for help.")
     elif isinstance(error, commands.BadArgument):
         await ctx.send("❌ Invalid argument. Please check your input.")
+    elif isinstance(error, commands.NoPrivateMessage):
+        await ctx.send("❌ This command only works in a server.")
+    elif isinstance(error, commands.CommandOnCooldown):
+        await ctx.send(f"⏳ Slow down! Try again in {error.retry_after:.1f}s.")
     elif isinstance(error, commands.CommandNotFound):
         # Ignore unknown commands
         pass
@@ -998,11 +1395,57 @@ async def on_command_error(ctx, error):
 
 @bot.event
 async def on_ready():
+    # on_ready fires again after a reconnect; only the first one is startup
+    if bot.startup_seconds is None:
+        bot.startup_seconds = time.perf_counter() - PROCESS_STARTED
     print(f'✅ Bot {bot.user} successfully connected!')
+    print(f'⏱️ Ready {bot.startup_seconds:.1f}s after start')
     print(f'📊 Servers: {len(bot.guilds)}')
     print(f'🎮 Commands loaded: {len(bot.commands)}')
-    print(f'🎭 RP Commands: {len(rp_actions)}')
-    print(f'📁 Level data loaded for {len(user_levels)} users')
+    print(f'🎭 RP Commands: {len(rp_catalog.actions)}')
+    
+    # One-time migrations: split the old global levels (levels.json or the SQLite
+    # backend's global table) into guild shards, then switch stored XP to cumulative totals
+    if not level_shards.ready.is_set():
+        if CLUSTER_ID is not None and has_global_levels(LEVELS_FILE, LEVELS_DB):
+            # A worker only knows its own guilds: splitting here would strand everyone else's levels
+            print('❌ The global levels have not been split into guild shards yet: '
+                  'start main.py once on its own first')
+            await bot.close()
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            if has_global_levels(LEVELS_FILE, LEVELS_DB):
+                # Lean mode has no member lists yet, so chunk each guild just for the split
+                guild_members = {
+                    guild.id: [member.id for member in await bot.member_cache.all_members(guild)]
+                    for guild in bot.guilds
+                }
+                written = await loop.run_in_executor(
+                    None, migrate_global_levels, LEVELS_FILE, shard_path, guild_members, LEVELS_DB
+                )
+                print(f'📦 Split the global levels into {written} guild level shards')
+            if not os.path.exists(LEVELS_XP_MARKER):
+                os.makedirs(LEVELS_DIR, exist_ok=True)
+                converted = await loop.run_in_executor(
+                    None, convert_to_cumulative_xp, LEVELS_DIR, LEVELS_DB, LEVELS_XP_MARKER
+                )
+                print(f'📦 Converted XP of {converted} users to cumulative totals')
+        finally:
+            level_shards.ready.set()
+    print(f'📁 Level data is loaded per guild on first use (idle guilds unload after {LEVELS_IDLE_TIMEOUT:g}s)')
+    
+    # Pick up everyone already in voice and settle time earned while we were away
+    voice_tracker.rebuild(current_voice_states())
+    await voice_tracker.settle()
+    print(f'🎤 Voice sessions: {len(voice_tracker.sessions)}')
+    
+    if cluster_stats is not None:
+        await cluster_stats.publish()
+        totals = await cluster_stats.totals()
+        print(f"🌐 Cluster {CLUSTER_ID}: "
+              f"{totals['processes']} processes, {totals.get('guilds', 0)} servers, "
+              f"{totals.get('voice_sessions', 0)} voice sessions cluster-wide")
     
     # Set bot status
     await bot.change_presence(
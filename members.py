@@ -0,0 +1,133 @@
+import asyncio
+import re
+from typing import Dict, List, Optional
+
+import discord
+from discord.ext import commands
+
+from cache import TTLCache
+
+MEMBER_CACHE_MODES = ("full", "lean")
+
+# Remembered for this long when a fetch says the user is not in the guild
+NOT_A_MEMBER_TTL = 60.0
+
+_NOT_A_MEMBER = object()
+
+def member_cache_settings(mode: str) -> Dict[str, object]:
+    """Client keyword arguments for a member cache mode
+
+    'full' keeps every member of every guild (discord.py's default with the
+    members intent). 'lean' keeps only members in voice channels, does not
+    chunk guilds at startup, and leaves the rest to MemberCache.
+    """
+    if mode == "full":
+        # discord.py's defaults: cache flags follow the intents, guilds are chunked at startup
+        return {}
+    if mode == "lean":
+        flags = discord.MemberCacheFlags.none()
+        flags.voice = True
+        return {"member_cache_flags": flags, "chunk_guilds_at_startup": False}
+    raise ValueError(f"Unknown member cache mode: {mode} (expected one of {', '.join(MEMBER_CACHE_MODES)})")
+
+# --- ON-DEMAND MEMBER LOOKUPS ---
+
+class MemberCache:
+    """Recently active members on top of the gateway member cache
+
+    In lean mode discord.py only holds members who are in voice. Members
+    seen doing something (touch) and members fetched over REST are kept in
+    a bounded LRU that also expires entries after ttl seconds, so lookups
+    for active users stay free while idle members cost no memory. In full
+    mode the gateway cache has everyone and the LRU stays empty.
+    """
+    def __init__(self, maxsize: int = 50_000, ttl: float = 1800.0, lean: bool = True):
+        self.lean = lean
+        self.cache = TTLCache(maxsize, ttl)
+        self._chunking: Dict[int, asyncio.Task] = {}
+
+        self.gateway_hits = 0
+        self.fetches = 0
+        self.chunks = 0
+
+    def touch(self, member: discord.abc.User):
+        """Remember a member who was just active"""
+        if self.lean and isinstance(member, discord.Member):
+            self.cache.set((member.guild.id, member.id), member)
+
+    def get(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        """A member from the gateway cache or the LRU, without any requests"""
+        member = guild.get_member(user_id)
+        if member is not None:
+            self.gateway_hits += 1
+            return member
+        member = self.cache.get((guild.id, user_id))
+        return member if isinstance(member, discord.Member) else None
+
+    async def fetch(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        """A member from the caches, or from the API (None if not in the guild)"""
+        member = self.get(guild, user_id)
+        if member is not None or (guild.id, user_id) in self.cache:
+            return member
+
+        self.fetches += 1
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            self.cache.set((guild.id, user_id), _NOT_A_MEMBER, ttl=NOT_A_MEMBER_TTL)
+            return None
+        self.touch(member)
+        return member
+
+    async def all_members(self, guild: discord.Guild) -> List[discord.Member]:
+        """Every member of a guild, requesting them from the gateway if not cached
+
+        Chunks are not kept in lean mode; concurrent callers share one request.
+        """
+        if guild.chunked:
+            return guild.members
+        task = self._chunking.get(guild.id)
+        if task is None:
+            self.chunks += 1
+            task = self._chunking[guild.id] = asyncio.create_task(guild.chunk(cache=not self.lean))
+            task.add_done_callback(lambda _: self._chunking.pop(guild.id, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        cache = self.cache.stats()
+        return {
+            "size": cache["size"],
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "evictions": cache["evictions"],
+            "gateway_hits": self.gateway_hits,
+            "fetches": self.fetches,
+            "chunks": self.chunks,
+        }
+
+class MemberLookup(commands.MemberConverter):
+    """discord.Member converter that goes through the bot's MemberCache
+
+    Mentions are resolved from the message itself. A bare id or a mention
+    the message does not carry is looked up with MemberCache.fetch: the
+    gateway cache and the LRU first, then the API, remembering users who
+    turn out not to be members. Names are left to discord.py.
+    """
+    async def convert(self, ctx: commands.Context, argument: str) -> discord.Member:
+        member_cache: MemberCache = ctx.bot.member_cache
+        match = self._get_id_match(argument) or re.match(r'<@!?([0-9]{15,20})>$', argument)
+        if match is None or ctx.guild is None:
+            member = await super().convert(ctx, argument)
+            member_cache.touch(member)
+            return member
+
+        user_id = int(match.group(1))
+        member = discord.utils.get(ctx.message.mentions, id=user_id)
+        if isinstance(member, discord.Member):
+            member_cache.touch(member)
+            return member
+
+        member = await member_cache.fetch(ctx.guild, user_id)
+        if member is None:
+            raise commands.MemberNotFound(argument)
+        return member
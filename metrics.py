@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; command handlers include their Discord round trips
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds; flushes and compactions of the level stores
+IO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelKey = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: LabelKey, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+# --- METRIC TYPES ---
+
+class Counter:
+    """Monotonic count, optionally split by labels"""
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def series(self, **labels) -> "BoundCounter":
+        """The series for fixed label values, for hot paths that would rebuild the key every time"""
+        return BoundCounter(self.values, tuple(str(labels[name]) for name in self.labels))
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_labels(self.labels, key)} {value:g}' for key, value in sorted(self.values.items())]
+
+class BoundCounter:
+    """One series of a Counter with its label key worked out in advance"""
+    __slots__ = ("values", "key")
+
+    def __init__(self, values: Dict[LabelKey, float], key: LabelKey):
+        self.values = values
+        self.key = key
+
+    def inc(self, amount: float = 1):
+        self.values[self.key] = self.values.get(self.key, 0) + amount
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, read: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def samples(self) -> List[str]:
+        return [f'{self.name} {self.read():g}']
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, optionally split by labels"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # Per label key: [count per bucket (last one is +Inf), sum]
+        self.series: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, key: LabelKey = ()) -> int:
+        series = self.series.get(key)
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, key: LabelKey = ()) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None without data)"""
+        series = self.series.get(key)
+        if not series:
+            return None
+        rank = q * sum(series[0])
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {total:g}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+# --- REGISTRY ---
+
+class Registry:
+    """All metrics of the process, rendered in the Prometheus text format"""
+    def __init__(self):
+        self.metrics = []
+        self.started = time.time()
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, read: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(name, description, read))
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labels: Sequence[str] = ()) -> Histogram:
+        return self._add(Histogram(name, description, buckets, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # One broken gauge must not take the whole scrape down
+                print(f"⚠️ Metric {metric.name} failed: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+# --- HTTP ENDPOINT ---
+
+async def serve(registry: Registry, host: str = '127.0.0.1', port: int = 9108) -> asyncio.AbstractServer:
+    """Serve GET /metrics on host:port (localhost only by default)"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Headers are not needed, but must be read before answering
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', registry.render().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
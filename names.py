@@ -0,0 +1,84 @@
+import asyncio
+from typing import Dict, Iterable, Optional
+
+import discord
+
+from cache import TTLCache
+
+UNKNOWN_USER = "Unknown User"
+
+# --- USER NAME RESOLUTION ---
+
+class NameResolver:
+    """Resolve user ids to names with as few REST calls as possible
+
+    Lookup order: gateway cache (bot.get_user / guild members), then a
+    TTL+LRU cache of earlier fetches, then concurrent fetch_user calls for
+    whatever is still missing.
+    """
+    def __init__(self, bot, maxsize: int = 5000, ttl: float = 3600.0, concurrency: int = 4):
+        self.bot = bot
+        self.cache = TTLCache(maxsize, ttl)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.gateway_hits = 0
+        self.fetches = 0
+        self.failures = 0
+
+    def _from_gateway(self, user_id: int, guild: Optional[discord.Guild]) -> Optional[str]:
+        user = self.bot.get_user(user_id)
+        if user is None and guild is not None:
+            user = guild.get_member(user_id)
+        return user.name if user is not None else None
+
+    async def _fetch(self, user_id: int) -> str:
+        async with self._semaphore:
+            self.fetches += 1
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                # Deleted accounts stay unknown, remember that too
+                self.cache.set(user_id, UNKNOWN_USER)
+                return UNKNOWN_USER
+            except discord.HTTPException as e:
+                # Rate limits and outages are not cached so the next call retries
+                self.failures += 1
+                print(f"⚠️ Failed to fetch user {user_id}: {e.status} {e.text}")
+                return UNKNOWN_USER
+
+        self.cache.set(user_id, user.name)
+        return user.name
+
+    async def resolve_many(self, user_ids: Iterable, guild: Optional[discord.Guild] = None) -> Dict[int, str]:
+        """Map every id to a name, fetching misses concurrently"""
+        names: Dict[int, str] = {}
+        missing = []
+
+        for user_id in map(int, user_ids):
+            name = self._from_gateway(user_id, guild)
+            if name is not None:
+                self.gateway_hits += 1
+                names[user_id] = name
+                continue
+
+            name = self.cache.get(user_id)
+            if name is not None:
+                names[user_id] = name
+            else:
+                missing.append(user_id)
+
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(user_id) for user_id in missing))
+            names.update(zip(missing, fetched))
+        return names
+
+    def stats(self) -> Dict[str, int]:
+        cache = self.cache.stats()
+        return {
+            "gateway_hits": self.gateway_hits,
+            "cache_hits": cache["hits"],
+            "cache_misses": cache["misses"],
+            "cache_size": cache["size"],
+            "fetches": self.fetches,
+            "failures": self.failures,
+        }
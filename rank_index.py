@@ -0,0 +1,50 @@
+from typing import Dict, Any, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+# --- RANK INDEX ---
+
+class RankIndex:
+    """Order-statistic index of users by (level, xp)
+
+    Keys are kept sorted ascending, so a rank is one binary search and the
+    leaderboard is a slice from the end.
+    """
+    def __init__(self, data: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._keys: Dict[str, Tuple[int, int, str]] = {}
+        if data:
+            self._keys = {uid: (record["level"], record["xp"], uid) for uid, record in data.items()}
+        self._sorted = SortedList(self._keys.values())
+
+    @classmethod
+    def from_keys(cls, keys: List[Tuple[int, int, str]]) -> "RankIndex":
+        """Build from (level, xp, user_id) keys; near-linear if they are already in order"""
+        index = cls()
+        index._keys = {key[2]: key for key in keys}
+        index._sorted = SortedList(keys)
+        return index
+
+    def update(self, user_id: str, record: Dict[str, Any]):
+        """Insert or move a user after their level or XP changed"""
+        key = (record["level"], record["xp"], user_id)
+        old = self._keys.get(user_id)
+        if old == key:
+            return
+        if old is not None:
+            self._sorted.remove(old)
+        self._sorted.add(key)
+        self._keys[user_id] = key
+
+    def rank(self, level: int, xp: int) -> int:
+        """1 + number of users strictly ahead of (level, xp)"""
+        # (level, xp + 1) sorts before every key with that level and xp + 1, whatever the user id
+        return len(self._sorted) - self._sorted.bisect_left((level, xp + 1)) + 1
+
+    def top(self, limit: int) -> List[str]:
+        """User ids of the highest users, best first"""
+        if limit <= 0:
+            return []
+        return [key[2] for key in reversed(self._sorted[-limit:])]
+
+    def __len__(self) -> int:
+        return len(self._sorted)
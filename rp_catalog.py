@@ -0,0 +1,157 @@
+import json
+import re
+import string
+from typing import Callable, Dict, List
+
+# Action and category ids end up in command names and menu custom_ids, which Discord
+# caps at 100 characters (e.g. "menu:page:first:category:<id>:<page>")
+MAX_NAME_LENGTH = 32
+NAME_PATTERN = re.compile(rf'[a-z0-9_]{{1,{MAX_NAME_LENGTH}}}')
+
+# Placeholders an action text may use, in render() argument order
+TEMPLATE_FIELDS = ("author", "target")
+
+BUTTON_STYLES = ("primary", "secondary", "success", "danger")
+
+# The category menu puts two buttons per row and needs one row for back/close
+MAX_CATEGORIES = 8
+
+class CatalogError(ValueError):
+    """The RP catalog file is malformed"""
+
+# --- TEMPLATES ---
+
+def compile_template(text: str) -> Callable[[str, str], str]:
+    """Split an action text once into literals and placeholder slots
+
+    The returned render(author, target) only joins strings, so nothing is
+    parsed when an action is used.
+    """
+    pieces: List[str] = []
+    slots = []
+    try:
+        parsed = list(string.Formatter().parse(text))
+    except ValueError as e:
+        raise CatalogError(str(e)) from None
+
+    for literal, field, spec, conversion in parsed:
+        if literal:
+            pieces.append(literal)
+        if field is None:
+            continue
+        if field not in TEMPLATE_FIELDS:
+            raise CatalogError(f"unknown placeholder {{{field}}}, use one of {', '.join(TEMPLATE_FIELDS)}")
+        if spec or conversion:
+            raise CatalogError(f"placeholder {{{field}}} cannot have a format spec or conversion")
+        slots.append((len(pieces), TEMPLATE_FIELDS.index(field)))
+        pieces.append("")
+
+    def render(author: str, target: str) -> str:
+        values = (author, target)
+        out = pieces.copy()
+        for position, field in slots:
+            out[position] = values[field]
+        return "".join(out)
+
+    return render
+
+# --- CATALOG ---
+
+class RPAction:
+    __slots__ = ("name", "text", "render", "color", "gifs", "category", "category_name")
+
+    def __init__(self, name: str, text: str, color: int, gifs: List[str], category: str, category_name: str):
+        self.name = name
+        self.text = text
+        self.render = compile_template(text)
+        self.color = color
+        self.gifs = gifs
+        self.category = category
+        self.category_name = category_name
+
+class RPCatalog:
+    """Validated RP categories and the flat action lookup built from them
+
+    A catalog is never modified after loading; a reload builds a new one
+    and swaps the reference, so readers always see one consistent version.
+    """
+    def __init__(self, categories: Dict[str, dict], version: int = 0):
+        self.categories = categories
+        self.version = version
+        self.actions: Dict[str, RPAction] = {}
+        for category in categories.values():
+            self.actions.update(category["commands"])
+
+def _require(value, kind, where):
+    if not isinstance(value, kind):
+        raise CatalogError(f"{where}: expected {kind.__name__}, got {type(value).__name__}")
+    return value
+
+def _color(value, where) -> int:
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 0xffffff:
+        return value
+    if isinstance(value, str) and re.fullmatch(r'#[0-9a-fA-F]{6}', value):
+        return int(value[1:], 16)
+    raise CatalogError(f"{where}: expected a color like \"#ff69b4\"")
+
+def parse_catalog(raw, version: int = 0) -> RPCatalog:
+    """Validate the decoded catalog file and compile its templates"""
+    categories_raw = _require(_require(raw, dict, "catalog").get("categories"), dict, "categories")
+    if not categories_raw:
+        raise CatalogError("categories: the catalog has no categories")
+    if len(categories_raw) > MAX_CATEGORIES:
+        raise CatalogError(f"categories: at most {MAX_CATEGORIES} categories fit in the menu")
+
+    categories = {}
+    seen = {}
+    for cat_id, cat in categories_raw.items():
+        where = f"categories.{cat_id}"
+        if not NAME_PATTERN.fullmatch(cat_id):
+            raise CatalogError(f"{where}: category ids need 1-{MAX_NAME_LENGTH} of a-z, 0-9 and _")
+        _require(cat, dict, where)
+        name = _require(cat.get("name"), str, f"{where}.name")
+        style = cat.get("style", "secondary")
+        if style not in BUTTON_STYLES:
+            raise CatalogError(f"{where}.style: expected one of {', '.join(BUTTON_STYLES)}")
+        color = _color(cat.get("color"), f"{where}.color")
+
+        actions = {}
+        for cmd_name, cmd in _require(cat.get("commands"), dict, f"{where}.commands").items():
+            cmd_where = f"{where}.commands.{cmd_name}"
+            if not NAME_PATTERN.fullmatch(cmd_name):
+                raise CatalogError(f"{cmd_where}: command names need 1-{MAX_NAME_LENGTH} of a-z, 0-9 and _")
+            if cmd_name in seen:
+                raise CatalogError(f"{cmd_where}: already defined in categories.{seen[cmd_name]}")
+            seen[cmd_name] = cat_id
+
+            _require(cmd, dict, cmd_where)
+            text = _require(cmd.get("text"), str, f"{cmd_where}.text")
+            gifs = _require(cmd.get("gifs", []), list, f"{cmd_where}.gifs")
+            for url in gifs:
+                if not isinstance(url, str) or not url.startswith("https://"):
+                    raise CatalogError(f"{cmd_where}.gifs: {url!r} is not an https URL")
+            try:
+                actions[cmd_name] = RPAction(cmd_name, text, color, gifs, cat_id, name)
+            except CatalogError as e:
+                raise CatalogError(f"{cmd_where}.text: {e}") from None
+
+        if not actions:
+            raise CatalogError(f"{where}.commands: the category has no commands")
+        categories[cat_id] = {
+            "name": name,
+            "emoji": cat.get("emoji") and _require(cat["emoji"], str, f"{where}.emoji"),
+            "style": style,
+            "color": color,
+            "description": _require(cat.get("description", ""), str, f"{where}.description"),
+            "commands": actions,
+        }
+    return RPCatalog(categories, version)
+
+def load_catalog(path: str, version: int = 0) -> RPCatalog:
+    """Read and validate the catalog file (blocking; run reloads in an executor)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except json.JSONDecodeError as e:
+        raise CatalogError(f"{path}: {e}") from None
+    return parse_catalog(raw, version)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from storage import JsonBackend, WriteBehindStore
+
+class ShardUnavailable(RuntimeError):
+    """A guild's levels failed to load recently and are not retried yet"""
+
+# --- PER-GUILD LEVEL SHARDS ---
+
+class GuildShards:
+    """One level store per guild, loaded on first use and unloaded when idle
+
+    Memory follows the set of guilds that are actually active: a shard is
+    read from disk the first time its guild needs levels and closed (with a
+    final compaction) after idle_timeout seconds without use. A shard that
+    fails to load is not read again for retry_after seconds; until then
+    acquire() raises ShardUnavailable instead of hitting the disk.
+    """
+    def __init__(self, open_store: Callable[[int], WriteBehindStore],
+                 idle_timeout: float = 1800.0, sweep_interval: float = 300.0, retry_after: float = 60.0,
+                 on_load: Optional[Callable[[int, WriteBehindStore], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.open_store = open_store
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.retry_after = retry_after
+        self.on_load = on_load
+        self.clock = clock
+
+        self.shards: Dict[int, WriteBehindStore] = {}
+        self.last_used: Dict[int, float] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+        self._closing: Dict[int, asyncio.Task] = {}
+        # guild_id -> (retry time, error) of the last failed load
+        self._failed: Dict[int, Tuple[float, Exception]] = {}
+        # Closed until a pending migration of the global file has finished
+        self.ready = asyncio.Event()
+
+        self.loads = 0
+        self.unloads = 0
+        self.load_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load(self, guild_id: int) -> WriteBehindStore:
+        loop = asyncio.get_running_loop()
+        try:
+            # A shard that is still being closed must finish writing before it is read again
+            closing = self._closing.get(guild_id)
+            if closing is not None:
+                await asyncio.wait([closing])
+
+            # Reading and parsing the shard happens off the event loop
+            try:
+                store = await loop.run_in_executor(None, self.open_store, guild_id)
+            except Exception as e:
+                self._failed[guild_id] = (self.clock() + self.retry_after, e)
+                self.load_failures += 1
+                raise
+            self._failed.pop(guild_id, None)
+            store.start()
+            self.shards[guild_id] = store
+            self.loads += 1
+            if self.on_load is not None:
+                self.on_load(guild_id, store)
+            return store
+        finally:
+            del self._loading[guild_id]
+
+    async def acquire(self, guild_id: int) -> WriteBehindStore:
+        """Return a guild's store, loading it if needed"""
+        store = self.shards.get(guild_id)
+        if store is None:
+            await self.ready.wait()
+            store = self.shards.get(guild_id)
+        if store is None:
+            task = self._loading.get(guild_id)
+            if task is None:
+                failed = self._failed.get(guild_id)
+                if failed is not None and self.clock() < failed[0]:
+                    raise ShardUnavailable(f"Levels of guild {guild_id} failed to load: {failed[1]}")
+                task = self._loading[guild_id] = asyncio.create_task(self._load(guild_id))
+            # Shielded so one cancelled caller does not abort a load others wait on
+            store = await asyncio.shield(task)
+        self.last_used[guild_id] = self.clock()
+        return store
+
+    def peek(self, guild_id: int) -> Optional[WriteBehindStore]:
+        """A guild's store if it is loaded, without loading it"""
+        return self.shards.get(guild_id)
+
+    def use_loaded(self, guild_id: int) -> Optional[WriteBehindStore]:
+        """A guild's store if it is loaded, counted as a use (None otherwise, nothing is loaded)"""
+        store = self.shards.get(guild_id)
+        if store is not None:
+            self.last_used[guild_id] = self.clock()
+        return store
+
+    async def unload(self, guild_id: int):
+        store = self.shards.pop(guild_id, None)
+        self.last_used.pop(guild_id, None)
+        if store is not None:
+            task = self._closing[guild_id] = asyncio.create_task(store.close())
+            try:
+                await task
+            finally:
+                del self._closing[guild_id]
+            self.unloads += 1
+
+    async def sweep(self):
+        """Unload every shard that has been idle for idle_timeout"""
+        cutoff = self.clock() - self.idle_timeout
+        for guild_id in [gid for gid, used in self.last_used.items() if used <= cutoff]:
+            try:
+                await self.unload(guild_id)
+            except Exception as e:
+                print(f"❌ Failed to unload levels of guild {guild_id}: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    def start(self):
+        """Start the idle sweeper (must be called from a running loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the sweeper and close every loaded shard"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for guild_id in list(self.shards):
+            await self.unload(guild_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Shard counters plus the I/O counters of the loaded shards"""
+        totals = {"shards": len(self.shards), "loads": self.loads, "unloads": self.unloads,
+                  "load_failures": self.load_failures, "users": 0}
+        for store in self.shards.values():
+            totals["users"] += len(store.data)
+            for key, value in store.stats().items():
+                if key != "last_flush_ms":
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+# --- MIGRATION FROM THE GLOBAL FILE ---
+
+# Global table of the SQLite backend before levels were per guild
+GLOBAL_TABLE = 'levels'
+# It is renamed after the split; the name must not start with 'levels' so later migrations skip it
+MIGRATED_TABLE = 'migrated_levels'
+
+def _has_global_table(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (GLOBAL_TABLE,)
+    ).fetchone() is not None
+
+def has_global_levels(legacy_path: str, db_path: str) -> bool:
+    """Whether there is global level data (file or SQLite table) left to split"""
+    if os.path.exists(legacy_path):
+        return True
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return _has_global_table(conn)
+    finally:
+        conn.close()
+
+def migrate_global_levels(legacy_path: str, shard_path: Callable[[int], str],
+                          guild_members: Dict[int, Iterable[int]], db_path: Optional[str] = None) -> int:
+    """Split the old global levels into one file per guild
+
+    The source is the global table of db_path when it exists and has rows:
+    the SQLite backend kept the live data there, and levels.json is only
+    the copy it was migrated from. Otherwise it is levels.json. Every guild
+    gets the records of its members; guilds that already have a shard are
+    left alone. The global file is renamed to *.migrated and the global
+    table to MIGRATED_TABLE so the split runs only once. Returns the number
+    of shards written.
+    """
+    conn = None
+    data = None
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path, timeout=30)
+        if _has_global_table(conn):
+            data = {
+                user_id: {"xp": xp, "level": level, "messages": messages, "voice_time": voice_time}
+                for user_id, xp, level, messages, voice_time in conn.execute(
+                    f'SELECT user_id, xp, level, messages, voice_time FROM {GLOBAL_TABLE}')
+            }
+        else:
+            conn.close()
+            conn = None
+
+    try:
+        if not data and os.path.exists(legacy_path):
+            # The global file may still have an unfolded journal from the write-behind store
+            data = JsonBackend(legacy_path).load()
+
+        written = 0
+        for guild_id, member_ids in guild_members.items():
+            path = shard_path(guild_id)
+            if os.path.exists(path):
+                continue
+            shard = {}
+            for member_id in member_ids:
+                record = data.get(str(member_id)) if data else None
+                if record is not None:
+                    shard[str(member_id)] = record
+            if not shard:
+                continue
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(shard, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, path)
+            written += 1
+
+        if conn is not None:
+            with conn:
+                conn.execute(f'ALTER TABLE {GLOBAL_TABLE} RENAME TO {MIGRATED_TABLE}')
+    finally:
+        if conn is not None:
+            conn.close()
+
+    if os.path.exists(legacy_path):
+        os.replace(legacy_path, legacy_path + '.migrated')
+    journal_path = os.path.splitext(legacy_path)[0] + '.journal'
+    if os.path.exists(journal_path):
+        os.replace(journal_path, journal_path + '.migrated')
+    return written
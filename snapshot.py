@@ -0,0 +1,224 @@
+"""Binary level snapshots: a header plus fixed-size rows sorted by user id
+
+Layout (little-endian):
+    header  magic b'LVLSNAP\\0', format version (u16), row size (u16), row count (u64)
+    rows    user_id (u64), xp (i64), level (i32), messages (i64), voice_time (i64)
+
+Rows are sorted by user id, so a single user can be looked up through mmap
+with a binary search without reading the rest of the file.
+
+Usage: python snapshot.py to-binary <shard.json | levels dir>...
+       python snapshot.py to-json <shard.lvl | levels dir>...
+       python snapshot.py get <shard.lvl> <user_id>
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from columnar import FIELD_TYPES, ColumnarLevels
+
+MAGIC = b'LVLSNAP\0'
+FORMAT_VERSION = 1
+
+# Field order of a row after the user id (matches the journal rows)
+ROW_FIELDS = ("xp", "level", "messages", "voice_time")
+
+HEADER = struct.Struct('<8sHHQ')
+ROW = struct.Struct('<Q' + ''.join(FIELD_TYPES[field] for field in ROW_FIELDS))
+_USER_ID = struct.Struct('<Q')
+
+def _field_layout() -> Dict[str, Tuple[str, int]]:
+    """(array typecode, byte offset in a row) of every field"""
+    layout = {}
+    offset = _USER_ID.size
+    for field in ROW_FIELDS:
+        layout[field] = (FIELD_TYPES[field], offset)
+        offset += struct.calcsize('<' + FIELD_TYPES[field])
+    return layout
+
+_ID_LAYOUT = ('Q', 0)
+_LAYOUT = _field_layout()
+
+def _check_header(header: bytes, size: int, path: str) -> int:
+    """Validate a header against the file size; returns the row count"""
+    if size < HEADER.size:
+        raise ValueError(f"{path} is too short to be a level snapshot")
+    magic, version, row_size, count = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a level snapshot")
+    if version != FORMAT_VERSION or row_size != ROW.size:
+        raise ValueError(f"{path} has unsupported snapshot version {version} (row size {row_size})")
+    if size != HEADER.size + count * ROW.size:
+        raise ValueError(f"{path} is truncated: {count} rows expected, {size} bytes found")
+    return count
+
+# Rows are moved in and out one column at a time with strided slice copies,
+# which run in C instead of packing or unpacking a tuple per user.
+
+def _scatter(payload: bytearray, column: array, offset: int):
+    """Write a column into its place in every row"""
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    raw = column.tobytes()
+    width = column.itemsize
+    for byte in range(width):
+        payload[HEADER.size + offset + byte::ROW.size] = raw[byte::width]
+
+def _gather(payload, count: int, typecode: str, offset: int) -> array:
+    """Read one column out of every row"""
+    column = array(typecode)
+    width = column.itemsize
+    raw = bytearray(count * width)
+    start = HEADER.size + offset
+    for byte in range(width):
+        raw[byte::width] = payload[start + byte:start + count * ROW.size:ROW.size]
+    column.frombytes(raw)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+# --- WRITING ---
+
+def encode_snapshot(data: Mapping) -> bytes:
+    """Header plus sorted rows of a levels mapping (dict or ColumnarLevels)"""
+    if isinstance(data, ColumnarLevels):
+        ids = data.ids()
+        columns = {field: data.column(field) for field in ROW_FIELDS}
+    else:
+        ids = array(_ID_LAYOUT[0], map(int, data))
+        records = list(data.values())
+        columns = {
+            field: array(typecode, [record.get(field, 1 if field == "level" else 0) for record in records])
+            for field, (typecode, _) in _LAYOUT.items()
+        }
+
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    payload = bytearray(HEADER.size + len(ids) * ROW.size)
+    HEADER.pack_into(payload, 0, MAGIC, FORMAT_VERSION, ROW.size, len(ids))
+    _scatter(payload, array(_ID_LAYOUT[0], map(ids.__getitem__, order)), _ID_LAYOUT[1])
+    for field, (typecode, offset) in _LAYOUT.items():
+        _scatter(payload, array(typecode, map(columns[field].__getitem__, order)), offset)
+    return bytes(payload)
+
+def write_snapshot(path: str, data: Mapping) -> int:
+    """Atomically replace a binary snapshot; returns the bytes written"""
+    payload = encode_snapshot(data)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(payload)
+
+# --- READING ---
+
+def read_snapshot(path: str, into: Optional[MutableMapping] = None) -> MutableMapping:
+    """Load every row of a snapshot into `into` (a new dict by default)"""
+    data = {} if into is None else into
+    with SnapshotReader(path) as reader:
+        ids, columns = reader.columns()
+
+    if isinstance(data, ColumnarLevels):
+        data.extend_columns(ids, columns)
+    else:
+        for user_id, xp, level, messages, voice_time in zip(ids, *(columns[field] for field in ROW_FIELDS)):
+            data[str(user_id)] = {"xp": xp, "level": level, "messages": messages, "voice_time": voice_time}
+    return data
+
+class SnapshotReader:
+    """Read-only, memory-mapped view of a snapshot for point lookups
+
+    Opening maps the file without reading it; get() touches only the pages
+    its binary search lands on.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            self.count = _check_header(self._map[:HEADER.size], size, path)
+        except Exception:
+            self._file.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _user_id(self, index: int) -> int:
+        return _USER_ID.unpack_from(self._map, HEADER.size + index * ROW.size)[0]
+
+    def get(self, user_id) -> Optional[Dict[str, Any]]:
+        """One user's record, or None if the snapshot does not have it"""
+        key = int(user_id)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._user_id(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self._user_id(low) != key:
+            return None
+        _, *values = ROW.unpack_from(self._map, HEADER.size + low * ROW.size)
+        return dict(zip(ROW_FIELDS, values))
+
+    def columns(self) -> Tuple[array, Dict[str, array]]:
+        """Every row as columns: (user ids, {field: values}), copied out of the mapping"""
+        ids = _gather(self._map, self.count, *_ID_LAYOUT)
+        return ids, {field: _gather(self._map, self.count, *layout) for field, layout in _LAYOUT.items()}
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for index in range(self.count):
+            user_id, *values = ROW.unpack_from(self._map, HEADER.size + index * ROW.size)
+            yield str(user_id), dict(zip(ROW_FIELDS, values))
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- COMMAND LINE ---
+
+def _shard_files(paths, suffix: str):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(suffix):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def main():
+    # Converters live in storage so they can include the shard journals
+    from storage import binary_to_json, json_to_binary
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("to-binary", "to-json", "get"):
+        print('Usage: ' + __doc__.split('Usage: ', 1)[1].strip())
+        sys.exit(2)
+
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "get":
+        with SnapshotReader(args[0]) as reader:
+            print(reader.get(args[1]))
+        return
+
+    convert, suffix = (json_to_binary, '.json') if command == "to-binary" else (binary_to_json, '.lvl')
+    for path in _shard_files(args, suffix):
+        target, count, size = convert(path)
+        print(f"📦 {path} -> {target}: {count} users, {size} bytes")
+
+if __name__ == "__main__":
+    main()
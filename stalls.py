@@ -0,0 +1,124 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+# --- EVENT LOOP STALL DETECTION ---
+
+class StallWatchdog:
+    """Measure event-loop lag and attribute stalls to the code that caused them
+
+    A heartbeat coroutine wakes every interval seconds and notes how late it
+    was. A daemon thread watches the heartbeat; once the loop has been silent
+    for threshold seconds it samples the loop thread's stack, which is the
+    stack of whatever is blocking it. When the heartbeat runs again the stall
+    is recorded, with its full duration, under the innermost frame of the
+    sample that belongs to this project (library frames are skipped).
+    """
+    def __init__(self, threshold: float = 0.05, interval: float = 0.01,
+                 on_stall: Optional[Callable[[float, str], None]] = None,
+                 root: Optional[str] = None):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_stall = on_stall
+        self.root = root or os.path.dirname(os.path.abspath(__file__))
+
+        self.stalls = 0
+        self.max_lag = 0.0
+        # location -> [count, total seconds, worst seconds, stack of the worst]
+        self.offenders: Dict[str, list] = {}
+
+        self._beat = time.monotonic()
+        self._sample: Optional[Tuple[float, List[traceback.FrameSummary]]] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    # --- Heartbeat (event loop side) ---
+
+    async def _heartbeat(self):
+        while True:
+            before = self._beat
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+
+            lag = now - before - self.interval
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                sample = self._sample
+                self._sample = None
+                stack = sample[1] if sample is not None and sample[0] == before else []
+                self._record(lag, stack)
+
+    def _record(self, lag: float, stack: List[traceback.FrameSummary]):
+        location = self._locate(stack)
+        self.stalls += 1
+        entry = self.offenders.get(location)
+        if entry is None:
+            entry = self.offenders[location] = [0, 0.0, 0.0, ""]
+        entry[0] += 1
+        entry[1] += lag
+        print(f"⚠️ Event loop stalled for {lag * 1000:.0f}ms in {location}")
+        if lag > entry[2]:
+            # A new worst for this location: keep and log its stack
+            entry[2] = lag
+            entry[3] = "".join(traceback.format_list(stack[-8:]))
+            if entry[3]:
+                print(entry[3], end="")
+        if self.on_stall is not None:
+            self.on_stall(lag, location)
+
+    def _locate(self, stack: List[traceback.FrameSummary]) -> str:
+        """Innermost frame of this project, else the innermost frame at all"""
+        if not stack:
+            # Shorter than the sampling period, or the sample came too late
+            return "unknown (not sampled)"
+        for frame in reversed(stack):
+            path = os.path.abspath(frame.filename)
+            if path.startswith(self.root) and 'site-packages' not in path and path != os.path.abspath(__file__):
+                return f"{os.path.relpath(path, self.root)}:{frame.lineno} in {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+    # --- Sampler (watchdog thread side) ---
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            if time.monotonic() - beat < self.threshold:
+                continue
+            sample = self._sample
+            if sample is not None and sample[0] == beat:
+                # This stall already has its sample
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._sample = (beat, traceback.extract_stack(frame))
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start the heartbeat and the sampler thread (must be called from the running loop)"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        threading.Thread(target=self._watch, name='stall-watchdog', daemon=True).start()
+
+    def close(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def worst(self, limit: int = 10) -> List[Tuple[str, int, float, float, str]]:
+        """(location, count, total, worst, stack) of the biggest offenders by total stall time"""
+        ranked = sorted(self.offenders.items(), key=lambda item: item[1][1], reverse=True)
+        return [(location, *entry) for location, entry in ranked[:limit]]
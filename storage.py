@@ -0,0 +1,764 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from rank_index import RankIndex
+from columnar import ColumnarLevels
+from leveling import level_for_xp, xp_for_level
+from snapshot import read_snapshot, write_snapshot
+
+# Order of fields in a journal row: [user_id, xp, level, messages, voice_time]
+JOURNAL_FIELDS = ("xp", "level", "messages", "voice_time")
+
+# File extension of binary snapshots, which sit next to where the JSON shard would be
+BINARY_SUFFIX = '.lvl'
+
+# JSON snapshots are parsed in pieces of this many characters
+SNAPSHOT_CHUNK = 1 << 16
+
+# Records copied or encoded at a time by a compaction, so neither holds the event loop
+# (or the GIL) for a whole snapshot
+SNAPSHOT_SLICE = 10_000
+
+# One '"user_id": ' prefix of a snapshot entry (separators and whitespace before it included)
+_SNAPSHOT_KEY = re.compile(r'[\s,]*"([^"\\]*(?:\\.[^"\\]*)*)"\s*:\s*')
+_SNAPSHOT_OPEN = re.compile(r'\s*\{')
+_SNAPSHOT_CLOSE = re.compile(r'[\s,]*\}')
+
+def iter_snapshot(path: str, chunk_size: int = SNAPSHOT_CHUNK) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (user_id, record) pairs of a JSON object file one at a time
+
+    Only one chunk of text is held at a time, instead of the whole file plus
+    the whole parsed dict that json.load needs. Each chunk is parsed in one
+    json.loads up to its last complete entry, so the GIL is released between
+    chunks instead of being held for the whole file; entries that do not
+    split cleanly (nested values, braces in strings) are decoded one by one.
+    """
+    raw_decode = json.JSONDecoder().raw_decode
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        eof = len(buffer) < chunk_size
+        match = _SNAPSHOT_OPEN.match(buffer)
+        if match is None:
+            raise ValueError(f"{path} does not contain a JSON object")
+        pos = match.end()
+        batched = False
+
+        while True:
+            if not batched:
+                # Every entry up to the last '}' at once, which ends an entry if the values are flat
+                # (at the end of the file, the object's own closing brace is left out)
+                batched = True
+                last = buffer.rfind('}', pos, len(buffer.rstrip()) - 1 if eof else len(buffer))
+                if last != -1:
+                    try:
+                        batch = json.loads('{' + buffer[pos:last + 1].lstrip(' \t\r\n,') + '}')
+                    except ValueError:
+                        batch = None
+                    if batch is not None:
+                        yield from batch.items()
+                        pos = last + 1
+
+            match = _SNAPSHOT_KEY.match(buffer, pos)
+            if match is not None:
+                try:
+                    record, end = raw_decode(buffer, match.end())
+                except ValueError:
+                    end = None
+                # A record ending exactly at the buffer end may be a number cut in half
+                if end is not None and (end < len(buffer) or eof):
+                    user_id = match.group(1)
+                    if '\\' in user_id:
+                        user_id = json.loads(f'"{user_id}"')
+                    yield user_id, record
+                    pos = end
+                    continue
+            elif _SNAPSHOT_CLOSE.match(buffer, pos):
+                return
+
+            # The next entry is cut off by the end of the chunk
+            if eof:
+                raise ValueError(f"{path}: malformed or truncated entry near {buffer[pos:pos + 40]!r}")
+            chunk = f.read(chunk_size)
+            eof = len(chunk) < chunk_size
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            batched = False
+
+# --- BACKENDS ---
+
+class JsonBackend:
+    """levels.json snapshot plus an append-only journal
+
+    Every change appends one small row to the journal. Compaction folds the
+    journal into an atomically replaced snapshot, so the snapshot is never
+    half-written.
+    """
+    # Compaction needs a full copy of the data
+    full_snapshot = True
+    # Leaderboards are computed from memory
+    indexed = False
+    # None means the default thread pool
+    executor = None
+
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.journal_bytes = 0
+        self.replayed = 0
+
+    def load(self, into: Optional[MutableMapping] = None) -> MutableMapping:
+        """Read the snapshot and replay the journal on top of it
+
+        Records are streamed into `into` (a new dict by default), so the
+        file text is never in memory as a whole and a columnar store never
+        holds the records as dicts. Parsing in Python also lets the event
+        loop thread run between records, where json.load would hold the GIL
+        for the whole file.
+        """
+        data = {} if into is None else into
+        if os.path.exists(self.path):
+            self._read_snapshot(data)
+
+        if os.path.exists(self.journal_path):
+            self.replayed = self._replay(data)
+            self.journal_bytes = os.path.getsize(self.journal_path)
+        return data
+
+    def _read_snapshot(self, data: MutableMapping):
+        for user_id, record in iter_snapshot(self.path):
+            data[user_id] = record
+
+    def _replay(self, data: Dict[str, Dict[str, Any]]) -> int:
+        """Apply journal rows to data, skipping a torn last line"""
+        count = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # A crash mid-append leaves at most one partial line
+                    continue
+                data[row[0]] = dict(zip(JOURNAL_FIELDS, row[1:]))
+                count += 1
+        return count
+
+    def write(self, rows: List[list]) -> int:
+        """Append rows to the journal and make them durable"""
+        payload = ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows).encode('utf-8')
+        with open(self.journal_path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_bytes += len(payload)
+        return len(payload)
+
+    def _write_snapshot(self, snapshot: Dict[str, Dict[str, Any]]) -> int:
+        """Atomically replace the snapshot file
+
+        The same text as one json.dumps(indent=4), but encoded and written a
+        slice of records at a time: no single encode holds the GIL for the
+        whole file, and the file is never in memory as one string.
+        """
+        items = iter(snapshot.items())
+        if isinstance(snapshot, ColumnarLevels):
+            # Built here, in the worker thread, from the copy the store handed over
+            items = ((uid, dict(record)) for uid, record in items)
+
+        tmp_path = self.path + '.tmp'
+        written = 0
+        with open(tmp_path, 'wb') as f:
+            separator = b'{'
+            while True:
+                part = dict(islice(items, SNAPSHOT_SLICE))
+                if not part:
+                    break
+                # Without its braces: '\n    "user_id": {...},\n    ...'
+                payload = separator + json.dumps(part, ensure_ascii=False, indent=4)[1:-2].encode('utf-8')
+                written += f.write(payload)
+                separator = b','
+            written += f.write(b'{}' if separator == b'{' else b'\n}')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return written
+
+    def compact(self, rows: List[list], snapshot: Dict[str, Dict[str, Any]]) -> int:
+        """Journal the last rows, write the snapshot, then truncate the journal
+
+        The snapshot is copied no earlier than the rows are taken, so it
+        contains every row; records it caught mid-change are journaled again
+        after it and replayed over it. A crash between the replace and the
+        truncate only replays rows the snapshot already contains.
+        """
+        written = self.write(rows) if rows else 0
+        written += self._write_snapshot(snapshot)
+        with open(self.journal_path, 'wb'):
+            pass
+        self.journal_bytes = 0
+        return written
+
+    def pending_bytes(self) -> int:
+        """Bytes that the next compaction would fold away"""
+        return self.journal_bytes
+
+    def close(self):
+        pass
+
+class BinaryBackend(JsonBackend):
+    """Binary snapshot (see snapshot.py) plus the same append-only journal
+
+    Rows are fixed-width integers instead of indented JSON, so snapshots
+    are several times smaller and load without a JSON parser. A guild that
+    only has a JSON shard (legacy_json) is read from it once; the first
+    compaction writes the binary snapshot and renames the JSON file to
+    *.migrated. The journal file is shared with the JSON shard of the same
+    guild, which is safe because replaying a row twice changes nothing.
+    """
+    def __init__(self, path: str, legacy_json: Optional[str] = None):
+        super().__init__(path)
+        self.legacy_json = legacy_json
+
+    def load(self, into: Optional[MutableMapping] = None) -> MutableMapping:
+        """Read the snapshot (or the legacy JSON shard) and replay the journal"""
+        data = {} if into is None else into
+        if os.path.exists(self.path):
+            read_snapshot(self.path, data)
+        elif self.legacy_json and os.path.exists(self.legacy_json):
+            JsonBackend(self.legacy_json)._read_snapshot(data)
+
+        if os.path.exists(self.journal_path):
+            self.replayed = self._replay(data)
+            self.journal_bytes = os.path.getsize(self.journal_path)
+        return data
+
+    def _write_snapshot(self, snapshot: MutableMapping) -> int:
+        written = write_snapshot(self.path, snapshot)
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            # The binary snapshot now holds everything; the JSON shard would only go stale
+            os.replace(self.legacy_json, self.legacy_json + '.migrated')
+        return written
+
+class SqliteDatabase:
+    """One connection and one worker thread per database file, shared by its backends
+
+    Every guild shard is a table in the same file, so thousands of loaded
+    shards still cost one connection and one thread. The single worker runs
+    every query, which also keeps the connection from being used concurrently.
+    """
+    _open: Dict[str, "SqliteDatabase"] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self.users = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='levels-db')
+        self.conn = self.run(self._connect)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @classmethod
+    def acquire(cls, path: str) -> "SqliteDatabase":
+        """The shared database of a file, opening it on first use"""
+        key = os.path.abspath(path)
+        with cls._open_lock:
+            db = cls._open.get(key)
+            if db is None:
+                db = cls._open[key] = cls(path)
+            db.users += 1
+            return db
+
+    def release(self):
+        """Drop one user; the last one closes the connection and the worker"""
+        with self._open_lock:
+            self.users -= 1
+            if self.users:
+                return
+            del self._open[os.path.abspath(self.path)]
+        self.run(self.conn.close)
+        self.executor.shutdown(wait=True)
+
+    def run(self, func, *args):
+        """Run func on the database thread from any other thread and wait for it"""
+        return self.executor.submit(func, *args).result()
+
+    def wal_size(self) -> int:
+        wal_path = self.path + '-wal'
+        return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+class SqliteBackend:
+    """One table of a SQLite database in WAL mode, with an index for leaderboard queries"""
+    full_snapshot = False
+    indexed = True
+
+    def __init__(self, path: str, legacy_json: Optional[str] = None, table: str = 'levels'):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        self.path = path
+        self.table = table
+        self.legacy_json = legacy_json
+        self.replayed = 0
+        self.migrated = 0
+        self.db: Optional[SqliteDatabase] = None
+
+    @property
+    def conn(self) -> Optional[sqlite3.Connection]:
+        return self.db.conn if self.db is not None else None
+
+    @property
+    def executor(self) -> Optional[ThreadPoolExecutor]:
+        # Queries of every table in the file go through the database's one thread
+        return self.db.executor if self.db is not None else None
+
+    def load(self, into: Optional[MutableMapping] = None) -> MutableMapping:
+        """Open the shared database, create the table and migrate the legacy JSON on first use"""
+        self.db = SqliteDatabase.acquire(self.path)
+        try:
+            return self.db.run(self._load, {} if into is None else into)
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self, data: MutableMapping) -> MutableMapping:
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'user_id TEXT PRIMARY KEY, xp INTEGER NOT NULL, level INTEGER NOT NULL, '
+            'messages INTEGER NOT NULL, voice_time INTEGER NOT NULL)'
+        )
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_rank ON {self.table} (level, xp)')
+        self.conn.commit()
+
+        empty = self.conn.execute(f'SELECT 1 FROM {self.table} LIMIT 1').fetchone() is None
+        if empty and self.legacy_json and os.path.exists(self.legacy_json):
+            self.migrated = migrate_json_to_sqlite(self.legacy_json, self.conn, self.table)
+
+        for user_id, xp, level, messages, voice_time in self.conn.execute(
+                f'SELECT user_id, xp, level, messages, voice_time FROM {self.table}'):
+            data[user_id] = {"xp": xp, "level": level, "messages": messages, "voice_time": voice_time}
+        return data
+
+    def write(self, rows: List[list]) -> int:
+        """Upsert the latest row of every changed user in one transaction"""
+        latest = {row[0]: row for row in rows}
+        before = self.db.wal_size()
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT INTO {self.table} (user_id, xp, level, messages, voice_time) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET xp=excluded.xp, level=excluded.level, '
+                'messages=excluded.messages, voice_time=excluded.voice_time',
+                latest.values()
+            )
+        after = self.db.wal_size()
+        # The WAL only shrinks on checkpoint, so growth is what this write cost
+        return after - before if after >= before else after
+
+    def compact(self, rows: List[list], snapshot=None) -> int:
+        """Write the last rows and checkpoint the WAL back into the database"""
+        written = self.write(rows) if rows else 0
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return written
+
+    def pending_bytes(self) -> int:
+        return self.db.wal_size() if self.db is not None else 0
+
+    def top(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """Highest users by level and XP, read through the (level, xp) index"""
+        cursor = self.conn.execute(
+            f'SELECT user_id, xp, level, messages, voice_time FROM {self.table} '
+            'ORDER BY level DESC, xp DESC LIMIT ?', (limit,)
+        )
+        return [
+            (user_id, {"xp": xp, "level": level, "messages": messages, "voice_time": voice_time})
+            for user_id, xp, level, messages, voice_time in cursor
+        ]
+
+    def rank(self, level: int, xp: int) -> int:
+        """1 + number of users strictly ahead of (level, xp)"""
+        (ahead,) = self.conn.execute(
+            f'SELECT COUNT(*) FROM {self.table} WHERE level > ? OR (level = ? AND xp > ?)',
+            (level, level, xp)
+        ).fetchone()
+        return ahead + 1
+
+    def close(self):
+        if self.db is not None:
+            db, self.db = self.db, None
+            db.release()
+
+def migrate_json_to_sqlite(json_path: str, conn: sqlite3.Connection, table: str = 'levels') -> int:
+    """One-shot import of a levels JSON file (and its journal) into a SQLite table"""
+    data = JsonBackend(json_path).load()
+    with conn:
+        conn.executemany(
+            f'INSERT OR REPLACE INTO {table} (user_id, xp, level, messages, voice_time) VALUES (?, ?, ?, ?, ?)',
+            (
+                (user_id, record.get("xp", 0), record.get("level", 1),
+                 record.get("messages", 0), record.get("voice_time", 0))
+                for user_id, record in data.items()
+            )
+        )
+    print(f"📦 Migrated {len(data)} users from {json_path} to SQLite table {table}")
+    return len(data)
+
+def convert_to_cumulative_xp(levels_dir: str, db_path: str, marker_path: str) -> int:
+    """One-shot rewrite of relative XP (within the current level) to cumulative XP
+
+    Every JSON shard in levels_dir and every levels table in db_path gets
+    xp += xp_for_level(level), and the level is derived again from the new
+    total: the old code let xp run past a level's cost before levelling up,
+    so such a record belongs to a higher level now. Converted files are logged to a progress file
+    as they finish, so a run interrupted by a crash resumes instead of
+    converting a shard twice; the log becomes marker_path when all are done.
+    Returns the number of users converted.
+    """
+    progress_path = marker_path + '.progress'
+    done = set()
+    if os.path.exists(progress_path):
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            done = set(f.read().split())
+
+    converted = 0
+    with open(progress_path, 'a', encoding='utf-8') as progress:
+        def finished(name: str):
+            progress.write(name + '\n')
+            progress.flush()
+            os.fsync(progress.fileno())
+
+        if os.path.isdir(levels_dir):
+            for name in sorted(os.listdir(levels_dir)):
+                if not name.endswith('.json') or name in done:
+                    continue
+                backend = JsonBackend(os.path.join(levels_dir, name))
+                data = backend.load()
+                for record in data.values():
+                    record["xp"] = record.get("xp", 0) + xp_for_level(record.get("level", 1))
+                    record["level"] = level_for_xp(record["xp"])
+                backend.compact([], data)
+                converted += len(data)
+                finished(name)
+
+        if os.path.exists(db_path) and 'sqlite' not in done:
+            conn = sqlite3.connect(db_path, timeout=30)
+            try:
+                conn.create_function('xp_for_level', 1, xp_for_level, deterministic=True)
+                conn.create_function('level_for_xp', 1, level_for_xp, deterministic=True)
+                tables = [name for (name,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'levels%'")]
+                # All tables in one transaction: either every one is converted or none
+                with conn:
+                    for table in tables:
+                        # Both right-hand sides see the old row, so the level follows the new xp
+                        converted += conn.execute(
+                            f'UPDATE {table} SET xp = xp + xp_for_level(level), '
+                            f'level = level_for_xp(xp + xp_for_level(level))'
+                        ).rowcount
+            finally:
+                conn.close()
+            finished('sqlite')
+
+    os.replace(progress_path, marker_path)
+    return converted
+
+def json_to_binary(json_path: str, binary_path: Optional[str] = None) -> Tuple[str, int, int]:
+    """Write a JSON shard (journal included) as a binary snapshot next to it
+
+    Returns (binary path, users, bytes written). The JSON shard and journal
+    are left in place.
+    """
+    binary_path = binary_path or os.path.splitext(json_path)[0] + BINARY_SUFFIX
+    data = JsonBackend(json_path).load()
+    return binary_path, len(data), write_snapshot(binary_path, data)
+
+def binary_to_json(binary_path: str, json_path: Optional[str] = None) -> Tuple[str, int, int]:
+    """Write a binary snapshot (journal included) as a JSON shard next to it
+
+    Returns (JSON path, users, bytes written).
+    """
+    json_path = json_path or os.path.splitext(binary_path)[0] + '.json'
+    data = BinaryBackend(binary_path).load()
+    return json_path, len(data), JsonBackend(json_path)._write_snapshot(data)
+
+def create_backend(kind: str, json_path: str, db_path: str, table: str = 'levels'):
+    """Build a backend by name ('json', 'binary' or 'sqlite')"""
+    if kind == 'json':
+        return JsonBackend(json_path)
+    if kind == 'binary':
+        return BinaryBackend(os.path.splitext(json_path)[0] + BINARY_SUFFIX, legacy_json=json_path)
+    if kind == 'sqlite':
+        return SqliteBackend(db_path, legacy_json=json_path, table=table)
+    raise ValueError(f"Unknown level storage backend: {kind}")
+
+# --- WRITE-BEHIND LEVEL STORE ---
+
+class WriteBehindStore:
+    """In-memory level data written back to a backend in batches"""
+    def __init__(self, backend, flush_interval: float = 30.0, max_dirty: int = 500,
+                 compact_interval: float = 600.0, compact_bytes: int = 1024 * 1024,
+                 columnar: bool = False, on_timing: Optional[Callable[[str, float], None]] = None):
+        self.backend = backend
+        # Called with ("flush" | "compact", seconds) after each successful write
+        self.on_timing = on_timing
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.compact_interval = compact_interval
+        self.compact_bytes = compact_bytes
+
+        self.dirty: Set[str] = set()
+        self._rows: List[list] = []
+        # Fixed-width integer columns instead of one dict per user, filled as records are read
+        self.data: Dict[str, Dict[str, Any]] = backend.load(ColumnarLevels() if columnar else None)
+        self.ranks = RankIndex(self.data)
+        # Ids whose xp or level changed while a bulk pass computes off the loop (None otherwise)
+        self.touched: Optional[Set[str]] = None
+
+        # I/O counters
+        self.mutations = 0
+        self.flushes = 0
+        self.compactions = 0
+        self.bytes_written = 0
+        self.last_flush_duration = 0.0
+        self.last_compaction = time.monotonic()
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Mutations ---
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        """Return a user's record, creating an empty one on first use"""
+        record = self.data.get(user_id)
+        if record is None:
+            self.data[user_id] = {"xp": 0, "level": 1, "messages": 0, "voice_time": 0}
+            record = self.data[user_id]
+            self._reindex(user_id, record)
+        return record
+
+    def _reindex(self, user_id: str, record: Dict[str, Any]):
+        self.ranks.update(user_id, record)
+        if self.touched is not None:
+            self.touched.add(user_id)
+
+    def mark_dirty(self, user_id: str, reindex: bool = True):
+        """Queue the current state of a record after a change"""
+        record = self.data[user_id]
+        if reindex:
+            self._reindex(user_id, record)
+        self._rows.append([user_id] + [record[field] for field in JOURNAL_FIELDS])
+        self.dirty.add(user_id)
+        self.mutations += 1
+        if len(self._rows) >= self.max_dirty and self._wakeup is not None:
+            self._wakeup.set()
+
+    def grant_xp(self, user_ids: Iterable[str], amounts: Union[int, Iterable[int]],
+                 create: bool = True) -> Dict[str, int]:
+        """Add XP to several users and bring their levels up to date
+
+        amounts is either one amount for everyone or one per user id.
+        Levels are looked up from the cumulative XP, so a grant of any size
+        lands on the right level in one step. Users without a record are
+        created, or skipped when create is False. Returns {user_id: level}
+        for the users who went up a level.
+        """
+        if isinstance(amounts, int):
+            amounts = repeat(amounts)
+
+        leveled_up = {}
+        for user_id, amount in zip(user_ids, amounts):
+            user_id = str(user_id)
+            if user_id in self.data:
+                record = self.data[user_id]
+            elif create:
+                record = self.get(user_id)
+            else:
+                continue
+
+            xp = max(0, record["xp"] + amount)
+            level = level_for_xp(xp)
+            if level > record["level"]:
+                leveled_up[user_id] = level
+            record["xp"] = xp
+            record["level"] = level
+            self.mark_dirty(user_id)
+        return leveled_up
+
+    def record_message(self, user_id: str, amount: int) -> int:
+        """Count one message and add its XP; returns the new level, or 0 if it did not go up"""
+        self.get(user_id)["messages"] += 1
+        return self.grant_xp([user_id], amount).get(user_id, 0)
+
+    def rebuild_ranks(self, ranks: Optional[RankIndex] = None):
+        """Re-index every user at once after a bulk change, or take an index built off the loop"""
+        self.ranks = RankIndex(self.data) if ranks is None else ranks
+
+    def _take_pending(self):
+        """Detach the pending rows and dirty ids"""
+        rows, self._rows = self._rows, []
+        dirty, self.dirty = self.dirty, set()
+        return rows, dirty
+
+    def _restore_pending(self, rows: List[list], dirty: Set[str]):
+        """Put rows back in front of the queue after a failed write"""
+        self._rows = rows + self._rows
+        self.dirty |= dirty
+
+    async def _in_backend(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.backend.executor, func, *args)
+
+    # --- Background tasks ---
+
+    async def flush(self):
+        """Write pending rows without blocking the event loop"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._rows:
+                return
+
+            rows, dirty = self._take_pending()
+
+            start = time.perf_counter()
+            try:
+                written = await self._in_backend(self.backend.write, rows)
+            except Exception:
+                # Keep the rows so the next flush retries them
+                self._restore_pending(rows, dirty)
+                raise
+
+            self.last_flush_duration = time.perf_counter() - start
+            self.flushes += 1
+            self.bytes_written += written
+            if self.on_timing is not None:
+                self.on_timing("flush", self.last_flush_duration)
+
+    async def compact(self):
+        """Fold written changes into the backend's compact form"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._rows and self.backend.pending_bytes() == 0:
+                return
+
+            # Taken before the snapshot is copied, so the snapshot contains every row
+            rows, dirty = self._take_pending()
+            snapshot = None
+            if self.backend.full_snapshot:
+                if isinstance(self.data, ColumnarLevels):
+                    # Columns copy as whole buffers
+                    snapshot = self.data.copy()
+                else:
+                    snapshot = await self._copy_records()
+
+            start = time.perf_counter()
+            try:
+                written = await self._in_backend(self.backend.compact, rows, snapshot)
+            except Exception:
+                self._restore_pending(rows, dirty)
+                raise
+
+            if self.on_timing is not None:
+                self.on_timing("compact", time.perf_counter() - start)
+            self.compactions += 1
+            self.bytes_written += written
+            self.last_compaction = time.monotonic()
+
+    async def _copy_records(self) -> Dict[str, Dict[str, Any]]:
+        """Copy dict records a slice at a time, letting the event loop run in between
+
+        A record changed while the copy runs may be copied before or after
+        the change. Either way the change was queued as a row after the rows
+        this compaction writes, so it is journaled after the new snapshot.
+        """
+        user_ids = list(self.data)
+        snapshot = {}
+        for start in range(0, len(user_ids), SNAPSHOT_SLICE):
+            for user_id in user_ids[start:start + SNAPSHOT_SLICE]:
+                snapshot[user_id] = dict(self.data[user_id])
+            await asyncio.sleep(0)
+        return snapshot
+
+    def _compaction_due(self) -> bool:
+        pending = self.backend.pending_bytes()
+        if pending >= self.compact_bytes:
+            return True
+        return pending > 0 and time.monotonic() - self.last_compaction >= self.compact_interval
+
+    async def _run(self):
+        """Background loop: flush every flush_interval or when max_dirty is reached"""
+        # wait_for can swallow a cancel that lands as the wakeup fires, so close() also clears _task
+        while self._task is not None:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+                if self._compaction_due():
+                    await self.compact()
+            except Exception as e:
+                print(f"❌ Failed to save level data: {e}")
+
+    def start(self):
+        """Start the background flush task (must be called from a running loop)"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flush task, compact everything and release the backend"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.compact()
+        self.backend.close()
+
+    # --- Leaderboard queries ---
+
+    async def top(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """Users sorted by level and XP"""
+        if not self.backend.indexed:
+            return [(uid, self.data[uid]) for uid in self.ranks.top(limit)]
+        # Pending rows go out first so the query sees what memory sees
+        await self.flush()
+        return await self._in_backend(self.backend.top, limit)
+
+    async def rank(self, user_id: str) -> int:
+        """Position of a user on the leaderboard"""
+        record = self.data.get(user_id, {"level": 1, "xp": 0})
+        if not self.backend.indexed:
+            return self.ranks.rank(record["level"], record["xp"])
+
+        await self.flush()
+        return await self._in_backend(self.backend.rank, record["level"], record["xp"])
+
+    def stats(self) -> Dict[str, Any]:
+        """I/O counters for monitoring"""
+        return {
+            "mutations": self.mutations,
+            "flushes": self.flushes,
+            "compactions": self.compactions,
+            "bytes_written": self.bytes_written,
+            "journal_bytes": self.backend.pending_bytes(),
+            "pending": len(self._rows),
+            "last_flush_ms": round(self.last_flush_duration * 1000, 2),
+        }
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from bulk import XP_MAX, BulkRangeError, parse_bulk_args, run_bulk
+from leveling import level_for_xp
+from storage import JsonBackend, WriteBehindStore
+
+def make_store(tmp_path, xps, columnar=False):
+    backend = JsonBackend(str(tmp_path / "levels.json"))
+    store = WriteBehindStore(backend, columnar=columnar)
+    for user_id, xp in xps.items():
+        record = store.get(user_id)
+        record["xp"] = xp
+        record["level"] = level_for_xp(xp)
+        store.mark_dirty(user_id)
+    return store
+
+def levels(store):
+    return {user_id: (record["xp"], record["level"]) for user_id, record in store.data.items()}
+
+# --- confirm gate ---
+
+@pytest.mark.parametrize("args", [
+    ("reset",), ("reset", "now"), ("scale", "0"), ("scale", "-2"), ("scale", "0", "yes"),
+    ("scale", "nan"), ("scale", "inf"), ("add", str(XP_MAX + 1)), ("add",), ("recompute", "x"), ("drop",),
+])
+def test_invalid_or_unconfirmed_operations_are_refused(args):
+    with pytest.raises(ValueError):
+        parse_bulk_args(*args)
+
+def test_wiping_operations_run_with_confirm():
+    assert parse_bulk_args("reset", "confirm") == ()
+    assert parse_bulk_args("scale", "0", "confirm") == (0.0,)
+    assert parse_bulk_args("scale", "1.5") == (1.5,)
+    assert parse_bulk_args("add", "-100") == (-100,)
+
+# --- range checks ---
+
+@pytest.mark.parametrize("columnar", [False, True])
+@pytest.mark.parametrize("operation, value", [("add", XP_MAX), ("scale", 2.0 ** 62)])
+def test_overflow_is_refused_before_anything_changes(tmp_path, columnar, operation, value):
+    store = make_store(tmp_path, {"1": 10, "2": 5000}, columnar)
+    before = levels(store)
+    with pytest.raises(BulkRangeError):
+        asyncio.run(run_bulk(store, operation, value))
+    assert levels(store) == before
+    assert store.touched is None
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_negative_results_are_clamped_to_zero(tmp_path, columnar):
+    store = make_store(tmp_path, {"1": 10, "2": 5000}, columnar)
+    assert asyncio.run(run_bulk(store, "add", -1000)) == 2
+    assert levels(store) == {"1": (0, 1), "2": (4000, level_for_xp(4000))}
+    assert store.ranks.top(2) == ["2", "1"]
+
+# --- concurrent changes ---
+
+def test_grants_during_the_bulk_pass_are_kept(tmp_path):
+    store = make_store(tmp_path, {str(uid): 100 for uid in range(1, 1001)})
+
+    async def run():
+        bulk = asyncio.create_task(run_bulk(store, "scale", 2.0))
+        # Runs while the column math is in the worker thread
+        await asyncio.sleep(0)
+        store.grant_xp(["1", "new"], 50)
+        return await bulk
+
+    assert asyncio.run(run()) == 1001
+    assert store.data["1"]["xp"] == 300
+    assert store.data["2"]["xp"] == 200
+    assert store.data["new"]["xp"] == 100
+    assert store.ranks.rank(store.data["1"]["level"], 300) == 1
@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+
+from conftest import record
+from leveling import level_for_xp, xp_for_level
+from shards import MIGRATED_TABLE, has_global_levels, migrate_global_levels
+from storage import JsonBackend, SqliteBackend, convert_to_cumulative_xp
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def create_global_table(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            'CREATE TABLE levels (user_id TEXT PRIMARY KEY, xp INTEGER NOT NULL, level INTEGER NOT NULL, '
+            'messages INTEGER NOT NULL, voice_time INTEGER NOT NULL)'
+        )
+        conn.executemany('INSERT INTO levels VALUES (?, ?, ?, ?, ?)', rows)
+    conn.close()
+
+def table_names(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+# --- levels.json -> guild shards ---
+
+def test_split_global_file_into_guild_shards(tmp_path):
+    legacy = str(tmp_path / "levels.json")
+    write_json(legacy, {"1": record(10), "2": record(20), "3": record(30)})
+    # A row the write-behind store journaled but never compacted
+    JsonBackend(legacy).write([["2", 25, 1, 4, 0]])
+
+    def shard_path(guild_id):
+        return str(tmp_path / "levels" / f"{guild_id}.json")
+
+    written = migrate_global_levels(legacy, shard_path, {100: [1, 2], 200: [2, 3], 300: [4]})
+
+    assert written == 2
+    assert read_json(shard_path(100)) == {"1": record(10), "2": record(25, 1, 4)}
+    assert read_json(shard_path(200)) == {"2": record(25, 1, 4), "3": record(30)}
+    # A guild with no known members gets no shard
+    assert not os.path.exists(shard_path(300))
+    assert os.path.exists(legacy + '.migrated') and not os.path.exists(legacy)
+    assert os.path.exists(str(tmp_path / "levels.journal.migrated"))
+    assert not has_global_levels(legacy, str(tmp_path / "levels.db"))
+
+def test_split_leaves_existing_shards_alone(tmp_path):
+    legacy = str(tmp_path / "levels.json")
+    write_json(legacy, {"1": record(10)})
+    shard = str(tmp_path / "100.json")
+    write_json(shard, {"1": record(999)})
+
+    assert migrate_global_levels(legacy, lambda guild_id: str(tmp_path / f"{guild_id}.json"), {100: [1]}) == 0
+    assert read_json(shard) == {"1": record(999)}
+
+def test_split_prefers_the_sqlite_global_table(tmp_path):
+    legacy = str(tmp_path / "levels.json")
+    db_path = str(tmp_path / "levels.db")
+    # levels.json is the stale copy the SQLite backend was migrated from
+    write_json(legacy, {"1": record(10), "2": record(20)})
+    create_global_table(db_path, [("1", 500, 3, 40, 7)])
+    assert has_global_levels(str(tmp_path / "missing.json"), db_path)
+
+    def shard_path(guild_id):
+        return str(tmp_path / f"{guild_id}.json")
+
+    assert migrate_global_levels(legacy, shard_path, {100: [1, 2]}, db_path) == 1
+    assert read_json(shard_path(100)) == {"1": record(500, 3, 40, 7)}
+    tables = table_names(db_path)
+    assert MIGRATED_TABLE in tables and "levels" not in tables
+    assert not os.path.exists(legacy)
+    assert not has_global_levels(legacy, db_path)
+
+def test_split_falls_back_to_json_when_the_table_is_empty(tmp_path):
+    legacy = str(tmp_path / "levels.json")
+    db_path = str(tmp_path / "levels.db")
+    write_json(legacy, {"1": record(10)})
+    create_global_table(db_path, [])
+
+    assert migrate_global_levels(legacy, lambda guild_id: str(tmp_path / f"{guild_id}.json"), {100: [1]}, db_path) == 1
+    assert read_json(str(tmp_path / "100.json")) == {"1": record(10)}
+
+def test_guild_table_is_seeded_from_its_json_shard(tmp_path):
+    db_path = str(tmp_path / "levels.db")
+    shard = str(tmp_path / "100.json")
+    write_json(shard, {"1": record(10, 1, 2)})
+
+    backend = SqliteBackend(db_path, legacy_json=shard, table="levels_100")
+    try:
+        assert backend.load() == {"1": record(10, 1, 2)}
+        assert backend.migrated == 1
+    finally:
+        backend.close()
+
+    # Seeded once: later loads read the table even if the shard changes
+    write_json(shard, {"1": record(999)})
+    backend = SqliteBackend(db_path, legacy_json=shard, table="levels_100")
+    try:
+        assert backend.load() == {"1": record(10, 1, 2)}
+    finally:
+        backend.close()
+
+def test_guild_tables_share_one_connection(tmp_path):
+    db_path = str(tmp_path / "levels.db")
+    first = SqliteBackend(db_path, table="levels_1")
+    second = SqliteBackend(db_path, table="levels_2")
+    first.load()
+    second.load()
+    try:
+        assert first.conn is second.conn
+        assert first.executor is second.executor
+        first.write([["1", 10, 1, 1, 0]])
+        assert second.load() == {}
+        assert first.top(10) == [("1", record(10, 1, 1))]
+    finally:
+        first.close()
+        second.close()
+
+# --- relative -> cumulative XP ---
+
+def test_cumulative_conversion_runs_once_per_shard_and_table(tmp_path):
+    levels_dir = tmp_path / "levels"
+    levels_dir.mkdir()
+    write_json(str(levels_dir / "100.json"), {"1": record(5, 3), "2": record(0, 1)})
+    db_path = str(tmp_path / "levels.db")
+    backend = SqliteBackend(db_path, table="levels_200")
+    backend.load()
+    backend.write([["3", 7, 4, 0, 0]])
+    backend.close()
+    create_global_table(db_path, [])
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(f'ALTER TABLE levels RENAME TO {MIGRATED_TABLE}')
+        conn.execute(f"INSERT INTO {MIGRATED_TABLE} VALUES ('9', 1, 2, 0, 0)")
+    conn.close()
+
+    marker = str(levels_dir / ".cumulative_xp")
+    assert convert_to_cumulative_xp(str(levels_dir), db_path, marker) == 3
+
+    assert JsonBackend(str(levels_dir / "100.json")).load() == {
+        "1": record(5 + xp_for_level(3), 3), "2": record(0 + xp_for_level(1), 1),
+    }
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute('SELECT xp FROM levels_200').fetchall() == [(7 + xp_for_level(4),)]
+        # The renamed global table is not a levels table any more
+        assert conn.execute(f'SELECT xp FROM {MIGRATED_TABLE}').fetchall() == [(1,)]
+    finally:
+        conn.close()
+    assert os.path.exists(marker) and not os.path.exists(marker + '.progress')
+
+def test_interrupted_cumulative_conversion_resumes(tmp_path):
+    levels_dir = tmp_path / "levels"
+    levels_dir.mkdir()
+    write_json(str(levels_dir / "100.json"), {"1": record(5 + xp_for_level(3), 3)})
+    write_json(str(levels_dir / "200.json"), {"2": record(5, 3)})
+    marker = str(levels_dir / ".cumulative_xp")
+    # A crash after 100.json was converted
+    with open(marker + '.progress', 'w', encoding='utf-8') as f:
+        f.write("100.json\n")
+
+    assert convert_to_cumulative_xp(str(levels_dir), str(tmp_path / "levels.db"), marker) == 1
+    assert JsonBackend(str(levels_dir / "100.json")).load() == {"1": record(5 + xp_for_level(3), 3)}
+    assert JsonBackend(str(levels_dir / "200.json")).load() == {"2": record(5 + xp_for_level(3), 3)}
+
+def test_cumulative_conversion_recomputes_levels(tmp_path):
+    # Relative xp past the cost of the next level (xp_to_next(3) == 900)
+    levels_dir = tmp_path / "levels"
+    levels_dir.mkdir()
+    write_json(str(levels_dir / "100.json"), {"1": record(2000, 3)})
+    db_path = str(tmp_path / "levels.db")
+    backend = SqliteBackend(db_path, table="levels_200")
+    backend.load()
+    backend.write([["2", 2000, 3, 0, 0]])
+    backend.close()
+
+    marker = str(levels_dir / ".cumulative_xp")
+    assert convert_to_cumulative_xp(str(levels_dir), db_path, marker) == 2
+
+    xp = 2000 + xp_for_level(3)
+    assert level_for_xp(xp) == 4
+    assert JsonBackend(str(levels_dir / "100.json")).load() == {"1": record(xp, 4)}
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute('SELECT xp, level FROM levels_200').fetchall() == [(xp, 4)]
+    finally:
+        conn.close()
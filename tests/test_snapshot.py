@@ -0,0 +1,112 @@
+import json
+import os
+
+import pytest
+
+from columnar import ColumnarLevels
+from conftest import record
+from snapshot import HEADER, ROW, SnapshotReader, encode_snapshot, read_snapshot, write_snapshot
+from storage import BinaryBackend, binary_to_json, json_to_binary
+
+LEVELS = {
+    "300000000000000002": record(2_000_000_000_000, 500, 9, 4),
+    "300000000000000001": record(0),
+    "18446744073709551615": record(-1, 1, 2**62, 0),
+}
+
+def test_round_trip_dict(tmp_path):
+    path = str(tmp_path / "100.lvl")
+    size = write_snapshot(path, LEVELS)
+
+    assert size == os.path.getsize(path) == HEADER.size + len(LEVELS) * ROW.size
+    assert read_snapshot(path) == LEVELS
+
+def test_round_trip_columnar(tmp_path):
+    path = str(tmp_path / "100.lvl")
+    write_snapshot(path, ColumnarLevels.from_dict(LEVELS))
+
+    loaded = read_snapshot(path, ColumnarLevels())
+    assert isinstance(loaded, ColumnarLevels)
+    assert {user_id: dict(rec) for user_id, rec in loaded.items()} == LEVELS
+
+def test_columnar_and_dict_encode_the_same():
+    assert encode_snapshot(LEVELS) == encode_snapshot(ColumnarLevels.from_dict(LEVELS))
+
+def test_point_lookups(tmp_path):
+    path = str(tmp_path / "100.lvl")
+    write_snapshot(path, LEVELS)
+
+    with SnapshotReader(path) as reader:
+        assert len(reader) == 3
+        for user_id, rec in LEVELS.items():
+            assert reader.get(user_id) == rec
+        assert reader.get(300000000000000000) is None
+        assert reader.get(300000000000000003) is None
+        # Rows are sorted by user id
+        assert [user_id for user_id, _ in reader] == sorted(LEVELS, key=int)
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "100.lvl")
+    assert write_snapshot(path, {}) == HEADER.size
+
+    assert read_snapshot(path) == {}
+    assert len(read_snapshot(path, ColumnarLevels())) == 0
+    with SnapshotReader(path) as reader:
+        assert len(reader) == 0
+        assert reader.get(1) is None
+        assert list(reader) == []
+
+@pytest.mark.parametrize("cut", [1, ROW.size, ROW.size + 5])
+def test_truncated_snapshot_is_rejected(tmp_path, cut):
+    path = str(tmp_path / "100.lvl")
+    write_snapshot(path, LEVELS)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - cut)
+
+    with pytest.raises(ValueError, match="truncated"):
+        read_snapshot(path)
+
+@pytest.mark.parametrize("content", [b"", b"LVLSNAP", b"x" * HEADER.size])
+def test_short_or_foreign_file_is_rejected(tmp_path, content):
+    path = str(tmp_path / "100.lvl")
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    with pytest.raises(ValueError):
+        SnapshotReader(path)
+
+def test_binary_backend_migrates_legacy_json_on_compaction(tmp_path):
+    legacy = str(tmp_path / "100.json")
+    with open(legacy, 'w', encoding='utf-8') as f:
+        json.dump(LEVELS, f)
+    path = str(tmp_path / "100.lvl")
+
+    backend = BinaryBackend(path, legacy_json=legacy)
+    data = backend.load()
+    assert data == LEVELS
+
+    data["5"] = record(50)
+    backend.compact([["5", 50, 1, 0, 0]], data)
+    assert not os.path.exists(legacy) and os.path.exists(legacy + '.migrated')
+    assert BinaryBackend(path, legacy_json=legacy).load() == {**LEVELS, "5": record(50)}
+
+def test_binary_backend_replays_journal_over_snapshot(tmp_path):
+    path = str(tmp_path / "100.lvl")
+    write_snapshot(path, LEVELS)
+    backend = BinaryBackend(path)
+    backend.write([["300000000000000001", 7, 1, 1, 0]])
+
+    assert BinaryBackend(path).load()["300000000000000001"] == record(7, 1, 1)
+
+def test_converters_round_trip(tmp_path):
+    source = str(tmp_path / "100.json")
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump(LEVELS, f)
+
+    binary_path, count, size = json_to_binary(source)
+    assert (count, size) == (3, os.path.getsize(binary_path))
+    os.remove(source)
+    json_path, count, _ = binary_to_json(binary_path)
+    assert json_path == source and count == 3
+    with open(json_path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == LEVELS
@@ -0,0 +1,39 @@
+import asyncio
+
+from voice import VoiceTracker
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_failed_grant_keeps_minutes_owed(tmp_path):
+    clock = Clock()
+    grants = []
+    failing = {1}
+
+    async def grant(guild_id, minutes):
+        if guild_id in failing:
+            raise RuntimeError("levels unavailable")
+        grants.append((guild_id, minutes))
+
+    tracker = VoiceTracker(grant, str(tmp_path / "voice.json"), clock=clock)
+    for guild_id in (1, 2):
+        tracker.join(10, guild_id, guild_id * 100)
+        tracker.join(11, guild_id, guild_id * 100)
+    clock.now += 180
+
+    asyncio.run(tracker.settle())
+    assert grants == [(2, {10: 3, 11: 3})]
+    assert tracker.owed == {(1, 10): 180.0, (1, 11): 180.0}
+    assert tracker.granted_minutes == 6
+
+    # The next settle pays the earlier minutes on top of the new ones
+    failing.clear()
+    clock.now += 60
+    asyncio.run(tracker.settle())
+    assert grants[1:] == [(1, {10: 4, 11: 4}), (2, {10: 1, 11: 1})]
+    assert tracker.owed == {}
+    assert tracker.granted_minutes == 16
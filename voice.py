@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+# Sessions are per (guild_id, member_id): a bot can sit in voice in several guilds at once
+SessionKey = Tuple[int, int]
+
+# --- VOICE SESSIONS ---
+
+class VoiceSession:
+    """One member sitting in one voice channel
+
+    `mark` is the wall-clock time up to which the session has been
+    accounted, `seconds` the eligible time not yet converted into XP.
+    """
+    __slots__ = ("member_id", "guild_id", "channel_id", "mark", "seconds", "earns")
+
+    def __init__(self, member_id: int, guild_id: int, channel_id: int, mark: float,
+                 seconds: float = 0.0, earns: bool = True):
+        self.member_id = member_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.mark = mark
+        self.seconds = seconds
+        self.earns = earns
+
+    @property
+    def key(self) -> SessionKey:
+        return (self.guild_id, self.member_id)
+
+    def to_row(self) -> list:
+        return [self.member_id, self.guild_id, self.channel_id, self.mark, self.seconds, self.earns]
+
+    @classmethod
+    def from_row(cls, row: list) -> "VoiceSession":
+        return cls(*row)
+
+# --- VOICE XP TRACKER ---
+
+class VoiceTracker:
+    """Timestamp-based voice time accounting
+
+    Time is accrued per channel whenever its occupancy changes, so a
+    session earns exactly the time it spent with someone else in the
+    channel. Whole minutes are converted into XP on a slow settle tick.
+    Open sessions are saved to disk so a restart does not lose them.
+    """
+    def __init__(self, grant: Callable[[int, Dict[int, int]], Awaitable[None]], path: str,
+                 settle_interval: float = 300.0, max_offline: float = 6 * 3600,
+                 clock: Callable[[], float] = time.time):
+        self.grant = grant
+        self.path = path
+        self.settle_interval = settle_interval
+        # Longest gap (bot offline) credited to a member who is still in voice afterwards
+        self.max_offline = max_offline
+        self.clock = clock
+
+        self.sessions: Dict[SessionKey, VoiceSession] = {}
+        self.channels: Dict[int, Set[SessionKey]] = {}
+        # Eligible seconds of closed sessions, waiting for the next settle
+        self.owed: Dict[SessionKey, float] = {}
+        # Sessions loaded from disk, adopted or dropped by rebuild()
+        self.restored: Dict[SessionKey, VoiceSession] = self.load()
+
+        self.settles = 0
+        self.granted_minutes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Accounting ---
+
+    def _accrue(self, channel_id: int, now: float):
+        """Credit everyone in a channel for the time since their mark"""
+        members = self.channels.get(channel_id)
+        if not members:
+            return
+        social = len(members) >= 2
+        for key in members:
+            session = self.sessions[key]
+            if social and session.earns and now > session.mark:
+                session.seconds += now - session.mark
+            session.mark = now
+
+    def _accrue_all(self, now: float):
+        for channel_id in self.channels:
+            self._accrue(channel_id, now)
+
+    def _add(self, session: VoiceSession):
+        self.sessions[session.key] = session
+        self.channels.setdefault(session.channel_id, set()).add(session.key)
+
+    def _close(self, key: SessionKey) -> Optional[VoiceSession]:
+        session = self.sessions.pop(key, None)
+        if session is None:
+            return None
+        members = self.channels[session.channel_id]
+        members.discard(key)
+        if not members:
+            del self.channels[session.channel_id]
+        if session.seconds:
+            self.owed[key] = self.owed.get(key, 0.0) + session.seconds
+        return session
+
+    def join(self, member_id: int, guild_id: int, channel_id: int, earns: bool = True):
+        """Start (or move) a member's session in a guild; bots join with earns=False"""
+        session = self.sessions.get((guild_id, member_id))
+        if session is not None and session.channel_id == channel_id:
+            return
+        now = self.clock()
+        if session is not None:
+            self.leave(member_id, guild_id)
+
+        # Settle the channel at its old size before it changes
+        self._accrue(channel_id, now)
+        self._add(VoiceSession(member_id, guild_id, channel_id, now, earns=earns))
+
+    def leave(self, member_id: int, guild_id: int):
+        """End a member's session in a guild, keeping the time they earned"""
+        session = self.sessions.get((guild_id, member_id))
+        if session is None:
+            return
+        self._accrue(session.channel_id, self.clock())
+        self._close(session.key)
+
+    def suspend(self):
+        """Account everything up to now, e.g. when the gateway disconnects"""
+        self._accrue_all(self.clock())
+
+    def rebuild(self, voice_states: Iterable[Tuple[int, int, int, bool]]):
+        """Reconcile sessions with the current voice states after (re)connecting
+
+        voice_states yields (member_id, guild_id, channel_id, is_bot). Members
+        still in the channel they were in keep their session and are credited
+        for the gap (capped at max_offline); everyone else is closed at their
+        last mark, and newcomers start fresh.
+        """
+        now = self.clock()
+        restored, self.restored = self.restored, {}
+        current = {(guild_id, member_id): (channel_id, is_bot)
+                   for member_id, guild_id, channel_id, is_bot in voice_states}
+
+        # Close live sessions that left or moved while we were not watching
+        for key in list(self.sessions):
+            state = current.get(key)
+            if state is None or state[0] != self.sessions[key].channel_id:
+                self._close(key)
+
+        # Resume survivors (live or saved) and register newcomers
+        for key, (channel_id, is_bot) in current.items():
+            session = self.sessions.get(key)
+            if session is None:
+                saved = restored.pop(key, None)
+                if saved is None or saved.channel_id != channel_id:
+                    if saved is not None:
+                        restored[key] = saved
+                    guild_id, member_id = key
+                    self._add(VoiceSession(member_id, guild_id, channel_id, now, earns=not is_bot))
+                    continue
+                session = saved
+                self._add(session)
+            # Credit the gap, but never more than max_offline
+            session.mark = max(session.mark, now - self.max_offline)
+
+        # Saved sessions nobody resumed still keep what they had earned
+        for key, session in restored.items():
+            if session.seconds:
+                self.owed[key] = self.owed.get(key, 0.0) + session.seconds
+
+        # Occupancy is only known as of now, so use it for the whole gap
+        self._accrue_all(now)
+
+    def collect(self) -> Dict[int, Dict[int, int]]:
+        """Take whole earned minutes out of every session, grouped by guild"""
+        self._accrue_all(self.clock())
+        awards: Dict[int, Dict[int, int]] = {}
+
+        for session in self.sessions.values():
+            minutes = int(session.seconds // 60)
+            if minutes:
+                session.seconds -= minutes * 60
+                awards.setdefault(session.guild_id, {})[session.member_id] = minutes
+
+        # Closed sessions: sub-minute leftovers are dropped
+        for (guild_id, member_id), seconds in self.owed.items():
+            minutes = int(seconds // 60)
+            if minutes:
+                guild_awards = awards.setdefault(guild_id, {})
+                guild_awards[member_id] = guild_awards.get(member_id, 0) + minutes
+        self.owed = {}
+        return awards
+
+    async def settle(self):
+        """Convert earned minutes into XP and save open sessions"""
+        self.settles += 1
+        for guild_id, minutes in self.collect().items():
+            try:
+                await self.grant(guild_id, minutes)
+            except Exception as e:
+                # One guild failing (e.g. its levels did not load) must not stop the others;
+                # its minutes stay owed for the next settle
+                print(f"❌ Voice XP grant failed for guild {guild_id}: {e}")
+                for member_id, member_minutes in minutes.items():
+                    key = (guild_id, member_id)
+                    self.owed[key] = self.owed.get(key, 0.0) + member_minutes * 60
+            else:
+                self.granted_minutes += sum(minutes.values())
+
+        loop = asyncio.get_running_loop()
+        rows = [session.to_row() for session in self.sessions.values()]
+        await loop.run_in_executor(None, self._write, rows)
+
+    # --- Persistence ---
+
+    def load(self) -> Dict[SessionKey, VoiceSession]:
+        """Read sessions saved by a previous run"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)["sessions"]
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable voice sessions file: {e}")
+            return {}
+        sessions = (VoiceSession.from_row(row) for row in rows)
+        return {session.key: session for session in sessions}
+
+    def _write(self, rows: list):
+        """Atomically replace the sessions file (runs in a worker thread)"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"saved_at": self.clock(), "sessions": rows}, f)
+        os.replace(tmp_path, self.path)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.settle_interval)
+            try:
+                await self.settle()
+            except Exception as e:
+                print(f"❌ Voice XP settle failed: {e}")
+
+    def start(self):
+        """Start the settle task (must be called from a running loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the settle task and settle everything earned so far"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.settle()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.sessions),
+            "channels": len(self.channels),
+            "settles": self.settles,
+            "granted_minutes": self.granted_minutes,
+        }